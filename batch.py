@@ -0,0 +1,230 @@
+import numpy as np
+import duck_chess, bitboard, encoder
+from duck_chess import CODE_FEN, NOTATION
+from bitboard import PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, WHITE, BLACK, STRAIGHTS, DIAGONALS
+
+# Many positions held in NumPy arrays, so move generation and playing moves run over the whole batch at once instead of
+# looping over Boards. Squares are numbered y * 8 + x like bitboard.py, and bitmasks are uint64 with bit sq set for
+# square sq. Packing squares into masks assumes a little endian machine
+DUCK_CODE = 13
+KNIGHT_MASKS = np.array(bitboard.KNIGHT_MASKS, dtype=np.uint64)
+KING_MASKS = np.array(bitboard.KING_MASKS, dtype=np.uint64)
+PAWN_ATTACKS = np.array(bitboard.PAWN_ATTACKS, dtype=np.uint64)
+PAWN_FORWARD = np.array(bitboard.PAWN_FORWARD, dtype=np.uint64)
+# The rays get an empty 65th entry, so looking up square -1 (no blocker) takes nothing off
+RAYS = np.array([rays + [0] for rays in bitboard.RAYS], dtype=np.uint64)
+# One and two square pawn pushes by color then square, 0 where a pawn can't make them
+PAWN_PUSH = np.array([[bitboard.offsetMask(sq % 8, sq // 8, [(0, -1 if color == WHITE else 1)]) for sq in range(64)] for color in (WHITE, BLACK)], dtype=np.uint64)
+PAWN_DOUBLE = np.array([[1 << (sq - 16 if color == WHITE else sq + 16) if sq // 8 == (6 if color == WHITE else 1) else 0 for sq in range(64)] for color in (WHITE, BLACK)], dtype=np.uint64)
+BITS = np.array([1 << sq for sq in range(64)], dtype=np.uint64)
+# The rank an en passant square has to be on for each color to take it
+PASSANT_ROWS = np.array([2, 5])
+
+
+# Packs an (..., 64) bool array into (...) uint64 masks
+def packSquares(squares: np.ndarray) -> np.ndarray:
+    return np.packbits(squares, axis=-1, bitorder="little").view(np.uint64)[..., 0]
+
+# Unpacks uint64 masks into an (..., 64) bool array
+def unpackSquares(masks: np.ndarray) -> np.ndarray:
+    return np.unpackbits(np.ascontiguousarray(masks)[..., None].view(np.uint8), axis=-1, bitorder="little").astype(bool)
+
+# Returns the square number of the highest set bit of every mask, -1 for empty masks. Converting to a float can only
+# round up to the next power of two when the 53 bits below the highest are all set, which no ray of blockers has
+def highestSquare(masks: np.ndarray) -> np.ndarray:
+    return np.frexp(masks.astype(np.float64))[1] - 1
+
+# Returns what sliders on squares attack in the given directions, stopping at (and including) the first occupied square.
+# squares and occupied are flat arrays, one entry per slider
+def slidingAttacks(squares: np.ndarray, occupied: np.ndarray, directions: range) -> np.ndarray:
+    attacks = np.zeros(len(squares), dtype=np.uint64)
+    for direction in directions:
+        rays = RAYS[direction][squares]
+        blockers = rays & occupied
+        # The nearest blocker is the lowest bit when the ray walks up the square numbers and the highest otherwise
+        if bitboard.POSITIVE[direction]:
+            blockers &= ~blockers + np.uint64(1)
+        attacks |= rays ^ RAYS[direction][highestSquare(blockers)]
+    return attacks
+
+
+class BoardBatch():
+    # N positions, each at the start of a turn (the duck has been placed). codes holds the piece codes as (N, 64) uint8,
+    # passant is the en passant square or -1, and passant_time counts down like Board.passant_time
+    def __init__(self, boards: list) -> None:
+        self.codes, self.turn, duck_turn, passant, _ = encoder.readBatch(boards)
+        if duck_turn.any():
+            raise ValueError("Every position in a batch has to be at the start of a turn, not waiting for the duck")
+        self.codes = self.codes.copy()
+        self.passant = passant
+        self.castling = []
+        passant_time, halfmove, fullmove = [], [], []
+        for board in boards:
+            if isinstance(board, str):
+                fields = board.split()
+                self.castling.append(fields[2])
+                passant_time.append(1 if fields[3] != "-" and fields[1] == "w" else 0)
+                halfmove.append(int(fields[4]))
+                fullmove.append(int(fields[5]))
+            else:
+                self.castling.append(board.castling)
+                passant_time.append(board.passant_time)
+                halfmove.append(board.halfmove)
+                fullmove.append(board.fullmove)
+        self.passant_time = np.array(passant_time, dtype=np.int64)
+        self.halfmove = np.array(halfmove, dtype=np.int64)
+        self.fullmove = np.array(fullmove, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    # Returns flat arrays with an entry for every piece in the batch, the duck left out: the position it's in, its square,
+    # its color (bitboard.WHITE or BLACK) and its type (bitboard.PAWN to KING)
+    def pieceList(self) -> tuple:
+        rows, squares = np.nonzero((self.codes > 0) & (self.codes < DUCK_CODE))
+        codes = self.codes[rows, squares].astype(np.int64) - 1
+        return rows, squares, codes // 6, codes % 6
+
+    # The occupancy masks of white, black and the duck, each (N,)
+    def occupancy(self) -> tuple:
+        codes = self.codes
+        return packSquares((codes > 0) & (codes <= 6)), packSquares((codes > 6) & (codes < DUCK_CODE)), packSquares(codes == DUCK_CODE)
+
+    # Returns the squares every piece in pieces (as pieceList returns) attacks, own pieces included. The duck blocks
+    # sliders like any other piece
+    def pieceAttacks(self, pieces: tuple, occupied: np.ndarray) -> np.ndarray:
+        rows, squares, colors, types = pieces
+        attacks = np.zeros(len(rows), dtype=np.uint64)
+        for piece_type, masks in ((KNIGHT, KNIGHT_MASKS), (KING, KING_MASKS)):
+            found = types == piece_type
+            attacks[found] = masks[squares[found]]
+        found = types == PAWN
+        attacks[found] = PAWN_ATTACKS[colors[found], squares[found]]
+        for piece_type, directions in ((BISHOP, DIAGONALS), (ROOK, STRAIGHTS)):
+            found = (types == piece_type) | (types == QUEEN)
+            attacks[found] |= slidingAttacks(squares[found], occupied[rows[found]], directions)
+        return attacks
+
+    # Returns the (N, 64) masks of squares the piece on every square attacks, 0 for empty squares and the duck
+    def attackMasks(self) -> np.ndarray:
+        pieces = self.pieceList()
+        white, black, duck = self.occupancy()
+        masks = np.zeros(self.codes.shape, dtype=np.uint64)
+        masks[pieces[0], pieces[1]] = self.pieceAttacks(pieces, white | black | duck)
+        return masks
+
+    # Returns the (N, 2) masks of squares attacked by white and black
+    def attackedSquares(self, pieces: tuple = None, attacks: np.ndarray = None) -> np.ndarray:
+        if pieces is None:
+            pieces = self.pieceList()
+            white, black, duck = self.occupancy()
+            attacks = self.pieceAttacks(pieces, white | black | duck)
+        attacked = np.zeros((len(self), 2), dtype=np.uint64)
+        np.bitwise_or.at(attacked, (pieces[0], pieces[2]), attacks)
+        return attacked
+
+    # Returns (N, 64) masks of where the piece on every square can move, for the side to move only, matching
+    # Board.getAvailableMoves. Squares without one of their pieces get 0
+    def pieceMoves(self) -> np.ndarray:
+        pieces = self.pieceList()
+        white, black, duck = self.occupancy()
+        occupied = white | black | duck
+        mover = np.where(self.turn, WHITE, BLACK)
+        attacks = self.pieceAttacks(pieces, occupied)
+        enemy_attacks = self.attackedSquares(pieces, attacks)[np.arange(len(self)), 1 - mover]
+
+        # Only the side to move's pieces from here on
+        own = pieces[2] == mover[pieces[0]]
+        rows, squares, colors, types = (values[own] for values in pieces)
+        attacks = attacks[own]
+        friendly, enemy = np.where(self.turn, white, black)[rows], np.where(self.turn, black, white)[rows]
+        moves = attacks & ~(friendly | duck[rows])
+        king = types == KING
+        moves[king] &= ~enemy_attacks[rows[king]]
+
+        pawn = types == PAWN
+        rows, squares, colors, empty = rows[pawn], squares[pawn], colors[pawn], ~occupied[rows[pawn]]
+        single = PAWN_PUSH[colors, squares] & empty
+        pawn_moves = attacks[pawn] & enemy[pawn] | single
+        pawn_moves |= np.where(single != 0, PAWN_DOUBLE[colors, squares] & empty, np.uint64(0))
+        # Any of the three forward squares matching the en passant square, as long as it's on the enemy's side
+        passant = self.passant[rows]
+        passant = np.where((passant >= 0) & (passant // 8 == PASSANT_ROWS[colors]), BITS[passant], np.uint64(0))
+        pawn_moves |= PAWN_FORWARD[colors, squares] & passant & empty
+        moves[pawn] = pawn_moves
+
+        masks = np.zeros(self.codes.shape, dtype=np.uint64)
+        masks[pieces[0][own], pieces[1][own]] = moves
+        return masks
+
+    # Returns the (N,) masks of squares the duck can be placed on after the piece moves from_squares to to_squares
+    def duckSquares(self, from_squares: np.ndarray, to_squares: np.ndarray) -> np.ndarray:
+        white, black, duck = self.occupancy()
+        rows = np.arange(len(self))
+        occupied = (white | black) & ~BITS[from_squares] | BITS[to_squares]
+        # An en passant capture also frees the square of the pawn it takes
+        passant = np.isin(self.codes[rows, from_squares], (1, 7)) & (self.codes[rows, to_squares] == 0) & (from_squares % 8 != to_squares % 8)
+        taken = np.where(self.turn, to_squares + 8, to_squares - 8)
+        occupied &= ~np.where(passant, BITS[np.clip(taken, 0, 63)], np.uint64(0))
+        return ~occupied & ~duck
+
+    # Returns whether the side to move has lost its king, like Board.isKingTaken
+    def isLost(self) -> np.ndarray:
+        kings = np.where(self.turn, 6, 12)
+        return ~(self.codes == kings[:, None]).any(axis=1)
+
+    # Plays one compound move per position: the piece on from_squares goes to to_squares and the duck to duck_squares.
+    # Positions with a from square below 0 are left alone, so finished games can stay in the batch
+    def play(self, from_squares: np.ndarray, to_squares: np.ndarray, duck_squares: np.ndarray) -> None:
+        rows = np.flatnonzero(np.asarray(from_squares) >= 0)
+        from_squares, to_squares, duck_squares = (np.asarray(squares)[rows] for squares in (from_squares, to_squares, duck_squares))
+        codes = self.codes
+        piece, captured, white = codes[rows, from_squares], codes[rows, to_squares], self.turn[rows]
+        pawn = (piece == 1) | (piece == 7)
+
+        passant = pawn & (captured == 0) & (from_squares % 8 != to_squares % 8)
+        codes[rows[passant], np.where(white, to_squares + 8, to_squares - 8)[passant]] = 0
+        self.halfmove[rows] = np.where(pawn | (captured != 0), 0, self.halfmove[rows] + 1)
+        for step, time in ((16, 2), (-16, 1)):
+            double = pawn & (to_squares == from_squares + step)
+            self.passant[rows[double]] = from_squares[double] + step // 2
+            self.passant_time[rows[double]] = time
+        codes[rows, to_squares] = piece
+        codes[rows, from_squares] = 0
+
+        duck_rows, duck_cols = np.nonzero(codes[rows] == DUCK_CODE)
+        codes[rows[duck_rows], duck_cols] = 0
+        codes[rows, duck_squares] = DUCK_CODE
+        self.turn[rows] = ~white
+        self.fullmove[rows] += ~white
+        expired = self.passant_time[rows] == 0
+        self.passant[rows[expired]] = -1
+        self.passant_time[rows[~expired]] -= 1
+
+    # Returns the piece moves of one position as a dict of (x, y) to a list of destinations, like Board.getAllMoves
+    def getMoves(self, index: int, moves: np.ndarray = None) -> dict:
+        moves = self.pieceMoves()[index] if moves is None else moves
+        return {(sq % 8, sq // 8): [(dest % 8, dest // 8) for dest in np.flatnonzero(unpackSquares(moves[sq]))] for sq in np.flatnonzero(moves)}
+
+    def getFEN(self, index: int) -> str:
+        rows = []
+        for y in range(8):
+            text, spaces = "", 0
+            for code in self.codes[index, y * 8:y * 8 + 8]:
+                if code == 0:
+                    spaces += 1
+                    continue
+                if spaces:
+                    text += str(spaces)
+                    spaces = 0
+                text += CODE_FEN[code]
+            rows.append(text + (str(spaces) if spaces else ""))
+        passant = self.passant[index]
+        passant = f"{NOTATION[passant % 8]}{8 - passant // 8}" if passant >= 0 else "-"
+        return f"{'/'.join(rows)} {'w' if self.turn[index] else 'b'} {self.castling[index]} {passant} {self.halfmove[index]} {self.fullmove[index]}"
+
+    # Builds a Board for one position, carrying over the en passant countdown a FEN can't hold
+    def toBoard(self, index: int, backend: type = duck_chess.Board) -> duck_chess.Board:
+        board = backend(self.getFEN(index))
+        board.passant_time = int(self.passant_time[index])
+        return board
@@ -0,0 +1,491 @@
+from collections import namedtuple
+import duck_chess
+from duck_chess import DEFAULT_FEN, FEN_SYMBOLS, Piece, ZOBRIST_PIECES
+
+# Squares are numbered y * 8 + x, so bit 0 is a8 and bit 63 is h1, matching the (x, y) coordinates used by duck_chess.Board
+TYPES = ["Pawn", "Knight", "Bishop", "Rook", "Queen", "King"]
+COLORS = ["White", "Black"]
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+WHITE, BLACK = 0, 1
+FULL = (1 << 64) - 1
+
+# Directions as (dx, dy), the first four are straight lines and the last four are diagonals
+DIRECTIONS = [(0, -1), (0, 1), (1, 0), (-1, 0), (1, -1), (-1, -1), (1, 1), (-1, 1)]
+STRAIGHTS = range(0, 4)
+DIAGONALS = range(4, 8)
+
+# Shared piece objects handed out by getPiece, so looking at a square doesn't allocate
+PIECES = [[duck_chess.PIECES[(piece_type, color)] for piece_type in TYPES] for color in COLORS]
+DUCK = duck_chess.PIECES[("Duck", "Duck")]
+EMPTY = duck_chess.EMPTY
+
+# Maps FEN characters to (color, type) indices and back
+FEN_INDEX = {char: (COLORS.index(value[1]), TYPES.index(value[0])) for char, value in FEN_SYMBOLS.items() if char != "D"}
+INDEX_FEN = {index: char for char, index in FEN_INDEX.items()}
+
+# The Board Zobrist keys rearranged by color and type index, so both backends hash a position the same
+ZOBRIST = [[ZOBRIST_PIECES[(piece_type, color)] for piece_type in TYPES] for color in COLORS]
+ZOBRIST_DUCK = ZOBRIST_PIECES[("Duck", "Duck")]
+
+# An immutable snapshot of a BitBoard, the getPosition/setPosition counterpart of duck_chess.Position. pieces holds
+# each color's masks as a tuple
+BitPosition = namedtuple("BitPosition", ["pieces", "duck", "turn", "castling", "passant", "passant_time", "halfmove", "fullmove", "duck_pos", "key"])
+
+
+def inBounds(x: int, y: int) -> bool:
+    return 0 <= x < 8 and 0 <= y < 8
+
+# Returns a bitmask of every in bounds square at the given offsets from (x, y)
+def offsetMask(x: int, y: int, offsets: list) -> int:
+    mask = 0
+    for x_offset, y_offset in offsets:
+        if inBounds(x + x_offset, y + y_offset):
+            mask |= 1 << ((y + y_offset) * 8 + x + x_offset)
+    return mask
+
+# Returns a bitmask of every square from (x, y) to the edge of the board in a direction, not including (x, y)
+def rayMask(x: int, y: int, direction: tuple) -> int:
+    mask = 0
+    x, y = x + direction[0], y + direction[1]
+    while inBounds(x, y):
+        mask |= 1 << (y * 8 + x)
+        x, y = x + direction[0], y + direction[1]
+    return mask
+
+# Attack tables, computed once at import
+KNIGHT_MASKS = [offsetMask(sq % 8, sq // 8, [(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)]) for sq in range(64)]
+KING_MASKS = [offsetMask(sq % 8, sq // 8, [(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)]) for sq in range(64)]
+PAWN_ATTACKS = [
+    [offsetMask(sq % 8, sq // 8, [(1, -1), (-1, -1)]) for sq in range(64)],
+    [offsetMask(sq % 8, sq // 8, [(1, 1), (-1, 1)]) for sq in range(64)]
+]
+# Pawn pushes plus diagonals, the three squares en passant is checked against
+PAWN_FORWARD = [
+    [offsetMask(sq % 8, sq // 8, [(1, -1), (0, -1), (-1, -1)]) for sq in range(64)],
+    [offsetMask(sq % 8, sq // 8, [(1, 1), (0, 1), (-1, 1)]) for sq in range(64)]
+]
+RAYS = [[rayMask(sq % 8, sq // 8, direction) for sq in range(64)] for direction in DIRECTIONS]
+# Whether a direction walks towards higher square numbers, which decides if the nearest blocker is the lowest or highest bit
+POSITIVE = [direction[1] * 8 + direction[0] > 0 for direction in DIRECTIONS]
+
+
+# Returns the squares a slider on sq attacks in the given directions, stopping at (and including) the first occupied square
+def slidingAttacks(sq: int, occupied: int, directions: range) -> int:
+    attacks = 0
+    for direction in directions:
+        ray = RAYS[direction][sq]
+        blockers = ray & occupied
+        if blockers:
+            if POSITIVE[direction]:
+                blocker = (blockers & -blockers).bit_length() - 1
+            else:
+                blocker = blockers.bit_length() - 1
+            ray ^= RAYS[direction][blocker]
+        attacks |= ray
+    return attacks
+
+# Yields the square number of every set bit, lowest first
+def iterBits(mask: int):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+def toCoords(mask: int) -> list:
+    return [(sq % 8, sq // 8) for sq in iterBits(mask)]
+
+
+class BitBoard(duck_chess.Board):
+    # Same interface as duck_chess.Board, but the position lives in one 64 bit int per piece type and color plus one for the duck
+    def __init__(self, fen: str=DEFAULT_FEN) -> None:
+        self.pieces = [[0] * 6, [0] * 6]
+        self.duck = 0
+        self.turn = True
+        self.duck_turn = False
+        self.castling = 'KQkq'
+        self.passant = '-'
+        self.halfmove = 0
+        self.fullmove = 1
+        self.passant_time = 0
+        self.key = 0
+        self.duck_pos = []
+        self.history = []
+        self.repetitions = {}
+        self.mobility_key = None
+        self.has_moves = False
+        self.setFEN(fen)
+
+    # Returns a copy of the board, cheap enough to use for copy-make tree walks
+    def copy(self) -> "BitBoard":
+        board = BitBoard.__new__(BitBoard)
+        board.pieces = [self.pieces[WHITE][:], self.pieces[BLACK][:]]
+        board.duck = self.duck
+        board.turn = self.turn
+        board.duck_turn = self.duck_turn
+        board.key = self.key
+        board.castling = self.castling
+        board.passant = self.passant
+        board.halfmove = self.halfmove
+        board.fullmove = self.fullmove
+        board.passant_time = self.passant_time
+        board.duck_pos = self.duck_pos
+        board.history = []
+        board.repetitions = dict(self.repetitions)
+        board.mobility_key, board.has_moves = self.mobility_key, self.has_moves
+        return board
+
+    # Returns an immutable snapshot of the position, without the move history
+    def getPosition(self) -> BitPosition:
+        return BitPosition((tuple(self.pieces[WHITE]), tuple(self.pieces[BLACK])), self.duck, self.turn, self.castling, self.passant, self.passant_time, self.halfmove, self.fullmove, self.duck_pos, self.key)
+
+    # Loads a snapshot from getPosition, clearing the move history
+    def setPosition(self, position: BitPosition) -> None:
+        self.pieces = [list(position.pieces[WHITE]), list(position.pieces[BLACK])]
+        self.duck = position.duck
+        self.turn = position.turn
+        self.duck_turn = False
+        self.castling = position.castling
+        self.passant = position.passant
+        self.passant_time = position.passant_time
+        self.halfmove = position.halfmove
+        self.fullmove = position.fullmove
+        self.duck_pos = position.duck_pos
+        self.key = position.key
+        self.history = []
+        self.repetitions = {self.key: 1}
+        self.mobility_key = None
+
+    # Puts pieces on squares, given as a list of (pos, piece), keeping the key up to date like Board.changeSquares.
+    # The duck waiting off the board isn't a square here, so changes to (0, 8) are left out
+    def changeSquares(self, changes: list) -> None:
+        for pos, piece in changes:
+            if pos[1] == 8:
+                continue
+            sq = pos[1] * 8 + pos[0]
+            bit = 1 << sq
+            self.key ^= duck_chess.ZOBRIST_CODES[self.getPiece(pos).code][sq] ^ duck_chess.ZOBRIST_CODES[piece.code][sq]
+            self.duck &= ~bit
+            for masks in self.pieces:
+                for piece_type in range(6):
+                    masks[piece_type] &= ~bit
+            if piece.type_id == duck_chess.DUCK:
+                self.duck = bit
+            elif piece.code != 0:
+                self.pieces[piece.color_id][piece.type_id] |= bit
+
+    # Returns a bitmask of every square occupied by the given color
+    def occupancy(self, color: int) -> int:
+        pieces = self.pieces[color]
+        return pieces[0] | pieces[1] | pieces[2] | pieces[3] | pieces[4] | pieces[5]
+
+    # Returns the (color, type) indices of whatever is on a square, or None if it is empty or holds the duck
+    def pieceAt(self, sq: int) -> tuple:
+        bit = 1 << sq
+        for color in (WHITE, BLACK):
+            for piece_type, mask in enumerate(self.pieces[color]):
+                if mask & bit:
+                    return color, piece_type
+        return None
+
+    # The list of lists view of the board, built on demand for callers that still walk it
+    @property
+    def board(self) -> list:
+        board = [[self.getPiece((x, y)) for x in range(8)] for y in range(8)]
+        if not self.duck:
+            board.append([DUCK])
+        return board
+
+    # Where each king is, or None once it has been taken
+    @property
+    def kings(self) -> dict:
+        kings = {}
+        for color in (WHITE, BLACK):
+            mask = self.pieces[color][KING]
+            kings[COLORS[color]] = ((mask.bit_length() - 1) % 8, (mask.bit_length() - 1) // 8) if mask else None
+        return kings
+
+    # Returns the piece at a given position, the duck sits at (0, 8) while it is off the board
+    def getPiece(self, pos: tuple) -> Piece:
+        x, y = pos
+        if y == 8:
+            return DUCK if x == 0 and not self.duck else EMPTY
+        sq = y * 8 + x
+        if self.duck >> sq & 1:
+            return DUCK
+        found = self.pieceAt(sq)
+        if found is None:
+            return EMPTY
+        return PIECES[found[0]][found[1]]
+
+    # Returns a list of squares attacked by the color that isn't moving
+    def getAttackedSquares(self) -> list:
+        return toCoords(self.attacksBy(BLACK if self.turn else WHITE))
+
+    # Returns whether any piece of the given color attacks a square
+    def isAttacked(self, pos: tuple, color: str) -> bool:
+        return bool(self.attacksBy(COLORS.index(color)) >> (pos[1] * 8 + pos[0]) & 1)
+
+    # Returns (row, column) like Board.findPiece
+    def findPiece(self, piece: Piece) -> tuple:
+        if piece.getType() == "Duck":
+            if self.duck:
+                sq = self.duck.bit_length() - 1
+                return (sq // 8, sq % 8)
+            return (8, 0)
+        mask = self.pieces[COLORS.index(piece.getColor())][TYPES.index(piece.getType())]
+        if mask:
+            sq = (mask & -mask).bit_length() - 1
+            return (sq // 8, sq % 8)
+        return (-1, -1)
+
+    def isKingTaken(self) -> bool:
+        return not self.pieces[WHITE if self.turn else BLACK][KING]
+
+    # Returns a dictionary of all possible moves, for testing purposes
+    def getAllMoves(self, color: str or bool = None) -> dict:
+        if type(color) == bool:
+            color = "White" if color else "Black"
+        moves = {}
+        for sq in sorted(sq for index in ((WHITE, BLACK) if color == None else (COLORS.index(color),)) for mask in self.pieces[index] for sq in iterBits(mask)):
+            moves[(sq % 8, sq // 8)] = toCoords(self.moveMask(sq))
+        return moves
+
+    # Returns the positions of a color's pieces in board order, optionally only those of one type
+    def getPieces(self, color: str, piece_type: str = None) -> list:
+        masks = self.pieces[COLORS.index(color)]
+        if piece_type != None:
+            return toCoords(masks[TYPES.index(piece_type)])
+        return toCoords(masks[PAWN] | masks[KNIGHT] | masks[BISHOP] | masks[ROOK] | masks[QUEEN] | masks[KING])
+
+    # Returns all legal moves for the piece at a given position
+    def getAvailableMoves(self, pos: tuple, attacking: bool = False) -> list:
+        x, y = pos
+        if y == 8:
+            return toCoords(self.moveMask(None)) if x == 0 and not self.duck else []
+        return toCoords(self.moveMask(y * 8 + x, attacking))
+
+    def iterPieceMoves(self, pos: tuple, attacking: bool = False):
+        return iter(self.getAvailableMoves(pos, attacking))
+
+    # Returns every empty square on the 8x8 board, in board order
+    def getEmptySquares(self) -> list:
+        return toCoords(FULL & ~(self.occupancy(WHITE) | self.occupancy(BLACK) | self.duck))
+
+    # Returns the moves of the piece on sq as a bitmask, sq of None is the off board duck
+    def moveMask(self, sq: int, attacking: bool = False) -> int:
+        white, black = self.occupancy(WHITE), self.occupancy(BLACK)
+        occupied = white | black | self.duck
+        if sq is None or self.duck >> sq & 1:
+            return ~occupied & FULL
+
+        found = self.pieceAt(sq)
+        if found is None:
+            return 0
+        color, piece_type = found
+        own, enemy = (white, black) if color == WHITE else (black, white)
+
+        if piece_type == PAWN:
+            if attacking:
+                return PAWN_ATTACKS[color][sq]
+            moves = PAWN_ATTACKS[color][sq] & enemy
+            step = -8 if color == WHITE else 8
+            if 0 <= sq + step < 64 and not occupied >> (sq + step) & 1:
+                moves |= 1 << (sq + step)
+                if sq // 8 == (6 if color == WHITE else 1) and not occupied >> (sq + 2 * step) & 1:
+                    moves |= 1 << (sq + 2 * step)
+            # Any of the three forward squares matching the en passant square is a move, same as Board
+            if self.passant not in (None, '-'):
+                x, y = self.getNotation(self.passant)
+                if y == (2 if color == WHITE else 5):
+                    moves |= PAWN_FORWARD[color][sq] & (1 << (y * 8 + x)) & ~occupied
+            return moves
+
+        if piece_type == KNIGHT:
+            return KNIGHT_MASKS[sq] if attacking else KNIGHT_MASKS[sq] & ~(own | self.duck)
+        if piece_type == KING:
+            return KING_MASKS[sq] if attacking else KING_MASKS[sq] & ~(own | self.duck | self.attacksBy(1 - color))
+
+        if piece_type == ROOK:
+            moves = slidingAttacks(sq, occupied, STRAIGHTS)
+        elif piece_type == BISHOP:
+            moves = slidingAttacks(sq, occupied, DIAGONALS)
+        else:
+            moves = slidingAttacks(sq, occupied, range(8))
+        return moves if attacking else moves & ~(own | self.duck)
+
+    # Moves Piece from target pos to dest
+    def movePiece(self, pos: tuple, dest: tuple) -> None:
+        dest_sq = dest[1] * 8 + dest[0]
+        dest_bit = 1 << dest_sq
+        self.key ^= self.getStateKey()
+
+        # Duck Movement
+        if pos[1] == 8 or self.duck >> (pos[1] * 8 + pos[0]) & 1:
+            if self.duck:
+                self.key ^= ZOBRIST_DUCK[self.duck.bit_length() - 1]
+            self.duck = dest_bit
+            self.key ^= ZOBRIST_DUCK[dest_sq]
+
+            # Switch turn
+            self.turn = not self.turn
+            self.duck_turn = False
+
+            # Increment fullmove once Black has finished their turn
+            if self.turn:
+                self.fullmove += 1
+
+            # Make En Passant Expire
+            if self.passant_time != 0:
+                self.passant_time += -1
+            else:
+                self.passant = None
+
+            self.duck_pos = dest
+            self.key ^= self.getStateKey()
+            self.repetitions[self.key] = self.repetitions.get(self.key, 0) + 1
+            return
+
+        pos_sq = pos[1] * 8 + pos[0]
+        found = self.pieceAt(pos_sq)
+        color, piece_type = found if found else (None, None)
+        occupied = self.occupancy(WHITE) | self.occupancy(BLACK) | self.duck
+
+        # Reset halfmoves if pawn move
+        if piece_type == PAWN:
+            self.halfmove = 0
+            # En passant handling
+            if pos[1] + 2 == dest[1]:
+                self.passant = self.getNotation((pos[0], pos[1] + 1))
+                self.passant_time = 2
+            elif pos[1] - 2 == dest[1]:
+                self.passant = self.getNotation((pos[0], pos[1] - 1))
+                self.passant_time = 1
+            # En Passant capture, the pawn behind the empty destination is removed
+            if not occupied & dest_bit and dest[0] != pos[0]:
+                self.clearSquare(dest_sq + 8 if color == WHITE else dest_sq - 8)
+        # Reset halfmoves if capture, otherwise incriment
+        elif occupied & dest_bit:
+            self.halfmove = 0
+        else:
+            self.halfmove += 1
+
+        # Actually move piece
+        self.clearSquare(dest_sq)
+        if found:
+            self.pieces[color][piece_type] ^= (1 << pos_sq) | dest_bit
+            self.key ^= ZOBRIST[color][piece_type][pos_sq] ^ ZOBRIST[color][piece_type][dest_sq]
+        self.duck_turn = True
+        self.key ^= self.getStateKey()
+
+    # Plays a move given as (pos, dest), saving the whole position since it is only a handful of ints
+    def makeMove(self, move: tuple) -> None:
+        self.history.append((self.pieces[WHITE][:], self.pieces[BLACK][:], self.duck, self.turn, self.duck_turn, self.castling, self.passant, self.passant_time, self.halfmove, self.fullmove, self.duck_pos, self.key))
+        self.movePiece(*move)
+
+    # Takes back the last move played with makeMove
+    def unmakeMove(self) -> None:
+        if not self.duck_turn:
+            self.forgetPosition()
+        white, black, self.duck, self.turn, self.duck_turn, self.castling, self.passant, self.passant_time, self.halfmove, self.fullmove, self.duck_pos, self.key = self.history.pop()
+        self.pieces = [white, black]
+
+    # Removes whatever is on a square
+    def clearSquare(self, sq: int) -> None:
+        if self.duck >> sq & 1:
+            self.duck = 0
+            self.key ^= ZOBRIST_DUCK[sq]
+            return
+        found = self.pieceAt(sq)
+        if found:
+            color, piece_type = found
+            self.pieces[color][piece_type] ^= 1 << sq
+            self.key ^= ZOBRIST[color][piece_type][sq]
+
+    # Attacks are a few mask lookups here, so they are worked out when asked for rather than kept up to date
+    def setAttackedSquares(self) -> None:
+        pass
+
+    # Returns a bitmask of every square attacked by the given color
+    def attacksBy(self, color: int) -> int:
+        occupied = self.occupancy(WHITE) | self.occupancy(BLACK) | self.duck
+        attacked = 0
+        pieces = self.pieces[color]
+        for sq in iterBits(pieces[PAWN]):
+            attacked |= PAWN_ATTACKS[color][sq]
+        for sq in iterBits(pieces[KNIGHT]):
+            attacked |= KNIGHT_MASKS[sq]
+        for sq in iterBits(pieces[KING]):
+            attacked |= KING_MASKS[sq]
+        for sq in iterBits(pieces[BISHOP]):
+            attacked |= slidingAttacks(sq, occupied, DIAGONALS)
+        for sq in iterBits(pieces[ROOK]):
+            attacked |= slidingAttacks(sq, occupied, STRAIGHTS)
+        for sq in iterBits(pieces[QUEEN]):
+            attacked |= slidingAttacks(sq, occupied, range(8))
+        return attacked
+
+    # Returns a FEN string of the current position
+    def getFEN(self) -> str:
+        fen = ""
+        for y in range(8):
+            spaces = 0
+            for x in range(8):
+                sq = y * 8 + x
+                if self.duck >> sq & 1:
+                    char = "D"
+                else:
+                    found = self.pieceAt(sq)
+                    char = INDEX_FEN[found] if found else None
+                if char is None:
+                    spaces += 1
+                else:
+                    if spaces:
+                        fen += str(spaces)
+                        spaces = 0
+                    fen += char
+            if spaces != 0:
+                fen += str(spaces)
+            if y != 7:
+                fen += "/"
+        fen += f" {'w' if self.turn else 'b'} {self.castling} {self.passant or '-'} {self.halfmove} {self.fullmove}"
+        return fen
+
+    # Sets the board state to a specific FEN Notation
+    def setFEN(self, fen: str) -> None:
+        self.parseFEN(fen)
+        self.repetitions = {self.key: 1}
+        self.mobility_key = None
+
+    # Parses a FEN onto the board and works out the key from scratch
+    def parseFEN(self, fen: str) -> None:
+        fen = duck_chess.validateFEN(fen)
+        self.pieces = [[0] * 6, [0] * 6]
+        self.duck = 0
+        self.duck_pos = (0, 8)
+
+        x, y = 0, 0
+        for char in fen[0]:
+            if char == '/':
+                y += 1
+                x = 0
+            elif char.isdigit():
+                x += int(char)
+            else:
+                if char == "D":
+                    self.duck = 1 << (y * 8 + x)
+                    self.duck_pos = (x, y)
+                else:
+                    color, piece_type = FEN_INDEX[char]
+                    self.pieces[color][piece_type] |= 1 << (y * 8 + x)
+                x += 1
+
+        # The non-piece stuff
+        self.turn = fen[1] == 'w'
+        self.duck_turn = False
+        self.castling = fen[2]
+        self.passant = fen[3]
+        self.halfmove = int(fen[4])
+        self.fullmove = int(fen[5])
+        self.passant_time = 1 if self.passant != '-' and self.turn else 0
+        self.history = []
+        self.key = self.computeKey()
@@ -1,4 +1,7 @@
+import functools
 import itertools
+import random
+from collections import namedtuple
 DEFAULT_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
 # DEFAULT_FEN = "8/5ppp/8/8/8/4K3/PPP4/8 w - - 0 1"
 FEN_SYMBOLS = {
@@ -17,16 +20,50 @@ FEN_SYMBOLS = {
     "D" : ["Duck", "Duck"]
 }
 NOTATION = ["a", "b", "c", "d", "e", "f", "g", "h"]
+# Piece types and colors as small ints, so the hot loops compare ints instead of strings
+TYPES = ["Pawn", "Knight", "Bishop", "Rook", "Queen", "King", "Duck"]
+COLORS = ["White", "Black", "Duck"]
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, DUCK = range(7)
+WHITE, BLACK = 0, 1
+# Directions a slider can look along, the first four are straight and the last four are diagonal
+STRAIGHTS = [(0, -1), (0, 1), (1, 0), (-1, 0)]
+DIAGONALS = [(1, -1), (-1, -1), (1, 1), (-1, 1)]
+KNIGHT_OFFSETS = [(1, -2), (-1, -2), (2, -1), (-2, -1), (2, 1), (-2, 1), (1, 2), (-1, 2)]
+KING_OFFSETS = [(-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1)]
 
-# Returns two lists, split at a location
-def raycastFrom(lst: list, pos) -> list:
-    index = lst.index(pos)
-    lst1, lst2 = lst[:index], lst[index + 1:]
-    lst1.reverse()
-    return lst1, lst2
+# Returns, for every square (as y * 8 + x), the (x, y) squares a list of offsets reaches without leaving the board
+def offsetTargets(offsets: list) -> list:
+    return [[(x + x_step, y + y_step) for x_step, y_step in offsets if 0 <= x + x_step < 8 and 0 <= y + y_step < 8] for y in range(8) for x in range(8)]
 
-class InvalidFenException(Exception):
-    # Raised when an invalid FEN is given.
+# Move tables, computed once at import and indexed by y * 8 + x
+KNIGHT_TARGETS = offsetTargets(KNIGHT_OFFSETS)
+KING_TARGETS = offsetTargets(KING_OFFSETS)
+# The squares a pawn of each color attacks, indexed by color id then square
+PAWN_ATTACKS = [offsetTargets([(1, -1), (-1, -1)]), offsetTargets([(1, 1), (-1, 1)])]
+# RAYS[sq][direction] runs from next to the square out to the edge of the board, directions are STRAIGHTS then DIAGONALS
+RAYS = [[[(x + x_step * i, y + y_step * i) for i in range(1, 8) if 0 <= x + x_step * i < 8 and 0 <= y + y_step * i < 8] for x_step, y_step in STRAIGHTS + DIAGONALS] for y in range(8) for x in range(8)]
+# The slice of RAYS each slider moves along
+SLIDER_RAYS = {ROOK: slice(0, 4), BISHOP: slice(4, 8), QUEEN: slice(0, 8)}
+
+# Zobrist keys, seeded so every process (and every run) hashes positions the same way
+_zobrist_random = random.Random(0xD0C5)
+ZOBRIST_PIECES = {(value[0], value[1]): [_zobrist_random.getrandbits(64) for sq in range(64)] for value in FEN_SYMBOLS.values()}
+ZOBRIST_TURN = _zobrist_random.getrandbits(64)
+ZOBRIST_DUCK_TURN = _zobrist_random.getrandbits(64)
+ZOBRIST_CASTLING = {char: _zobrist_random.getrandbits(64) for char in "KQkq"}
+ZOBRIST_PASSANT = {NOTATION[x] + str(8 - y): _zobrist_random.getrandbits(64) for y in range(8) for x in range(8)}
+
+# Everything makeMove needs to put back to undo a move. captured is whatever stood on dest,
+# passant_capture is the (pos, piece) of a pawn taken en passant, or None
+MoveRecord = namedtuple("MoveRecord", ["pos", "dest", "captured", "passant_capture", "turn", "duck_turn", "castling", "passant", "passant_time", "halfmove", "fullmove", "duck_pos", "key"])
+# A parsed FEN with everything setFEN would have worked out from it, in a form that can't be changed,
+# so one copy can be shared by every board loading that FEN. squares holds the 64 pieces in board order
+Position = namedtuple("Position", ["squares", "turn", "castling", "passant", "passant_time", "halfmove", "fullmove", "duck_pos", "key", "kings", "attack_counts", "piece_attacks", "piece_squares"])
+# How many parsed FENs loadFEN keeps around
+FEN_CACHE_SIZE = 4096
+
+class InvalidFenException(ValueError):
+    # Raised when an invalid FEN is given. It's a ValueError, so callers can catch bad FENs along with other bad input
     def __init__(self, fen, message="Fen notation was not valid: ") -> None:
         self.fen = fen
         self.message = message + f"\'{fen}\'"
@@ -34,11 +71,28 @@ class InvalidFenException(Exception):
 
 
 class Piece():
+    # Pieces never change once made, so every square holding a white rook can share the same object.
+    # type_id and color_id index TYPES and COLORS, and code is 0 for an empty square, 1-12 for pieces and 13 for the duck
+    __slots__ = ("type", "color", "type_id", "color_id", "code")
+    
     # Initialize the Piece with a set color and type. Both will be None if its an empty space
     def __init__(self, type, color) -> None:
-        self.type = type
-        self.color = color
-        self.available_moves = []
+        type_id = None if type == None else TYPES.index(type)
+        color_id = None if color == None else COLORS.index(color)
+        if type_id == None:
+            code = 0
+        elif type_id == DUCK:
+            code = 13
+        else:
+            code = color_id * 6 + type_id + 1
+        object.__setattr__(self, "type", type)
+        object.__setattr__(self, "color", color)
+        object.__setattr__(self, "type_id", type_id)
+        object.__setattr__(self, "color_id", color_id)
+        object.__setattr__(self, "code", code)
+    
+    def __setattr__(self, name, value) -> None:
+        raise AttributeError("Pieces can't be changed, put a different piece on the square instead")
     
     # Return's a piece's type
     def getType(self) -> str:
@@ -48,49 +102,62 @@ class Piece():
     def getColor(self) -> str:
         return self.color
     
-    # Resets available moves
-    def clearAvailableMoves(self) -> None:
-        self.available_moves = []
-    
-    # Adds a move to list of available moves
-    def addMove(self, move: tuple or list) -> None:
-        # Add single move
-        if type(move) == tuple:
-            self.available_moves.append(move)
-        # Add multiple moves from list
-        elif type(move) == list:
-            self.available_moves += move
-        else:
-            raise(TypeError("Invalid move type: " + type(move)))
-    
-    def removeMove(self, move: tuple or list) -> None:
-        # Delete single move
-        if type(move) == tuple:
-            self.available_moves.remove((move[1], move[0]))
-        # Delete multiple moves from list
-        elif type(move) == list:
-            for checked_move in move:
-                self.available_moves.remove((checked_move[1], checked_move[0]))
-        else:
-            raise(TypeError("Invalid move type: " + type(move)))
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Piece) and self.code == other.code
+    
+    def __hash__(self) -> int:
+        return self.code
+    
+    # Slots and the locked __setattr__ need pickling spelled out
+    def __reduce__(self) -> tuple:
+        return (Piece, (self.type, self.color))
             
     # Represents the Piece object as a string, mostly for debugging
     def __repr__(self) -> str:
         return(f"{self.color} {self.type}")     
 
+# The shared pieces the board is filled with, EMPTY stands on every empty square
+EMPTY = Piece(None, None)
+PIECES = {(value[0], value[1]): Piece(value[0], value[1]) for value in FEN_SYMBOLS.values()}
+FEN_PIECES = {char: PIECES[(value[0], value[1])] for char, value in FEN_SYMBOLS.items()}
+# FEN characters indexed by piece code, None for an empty square
+CODE_FEN = [None] * 14
+for _char, _piece in FEN_PIECES.items():
+    CODE_FEN[_piece.code] = _char
+# Zobrist keys indexed by piece code, empty squares hash to 0
+ZOBRIST_CODES = [[0] * 64] + [None] * 13
+for _piece in PIECES.values():
+    ZOBRIST_CODES[_piece.code] = ZOBRIST_PIECES[(_piece.type, _piece.color)]
+
 class Board():
     # Initialize Board with a List of column number of lists with row length
     def __init__(self, fen:str=DEFAULT_FEN, row=8, column=8) -> None:
-        self.board = [[Piece(None, None) for x in range(column)] for y in range(row)]
+        self.board = [[EMPTY] * column for y in range(row)]
         self.turn = True
+        # Whether the side to move has played their piece and still has to place the duck
+        self.duck_turn = False
         self.castling = 'KQkq'
         self.passant = '-'
         self.halfmove = 0
         self.fullmove = 1
         self.passant_time = 0
-        self.attacked_squares = []
+        # Zobrist hash of the position, kept up to date as pieces move
+        self.key = 0
+        # Number of pieces of each color attacking every square, indexed by y * 8 + x
+        self.attack_counts = {"White": [0] * 64, "Black": [0] * 64}
+        # The squares (as y * 8 + x) attacked by the piece standing on each square
+        self.piece_attacks = [None] * 64
+        self.kings = {"White": None, "Black": None}
+        # The squares (as y * 8 + x) holding each color's pieces, indexed by type id
+        self.piece_squares = {"White": [set() for i in range(6)], "Black": [set() for i in range(6)]}
         self.duck_pos = []
-        self.setFEN(DEFAULT_FEN)
+        self.history = []
+        # How many times each position has come up at the start of a turn, by key, for spotting repetitions
+        self.repetitions = {}
+        # The key of the last position hasPieceMoves looked at, and its answer
+        self.mobility_key = None
+        self.has_moves = False
+        self.setFEN(fen)
     
     # Returns the Board listself.board
     def getBoard(self) -> list:
@@ -111,202 +178,276 @@ class Board():
         elif type(pos) == str:
             return((NOTATION.index(pos[0]), 8 - int(pos[1])))
     
-    # Returns a list of attacked squares
+    # Returns the Zobrist hash of the position
+    def getKey(self) -> int:
+        return self.key
+    
+    # Returns the part of the hash that doesn't come from pieces: side to move, duck turn, castling and en passant
+    def getStateKey(self) -> int:
+        key = 0 if self.turn else ZOBRIST_TURN
+        if self.duck_turn:
+            key ^= ZOBRIST_DUCK_TURN
+        for char in self.castling:
+            key ^= ZOBRIST_CASTLING.get(char, 0)
+        if self.passant in ZOBRIST_PASSANT:
+            key ^= ZOBRIST_PASSANT[self.passant]
+        return key
+    
+    # Hashes the position from scratch, getKey should always match this
+    def computeKey(self) -> int:
+        key = self.getStateKey()
+        for y in range(8):
+            for x in range(8):
+                key ^= ZOBRIST_CODES[self.board[y][x].code][y * 8 + x]
+        return key
+    
+    # Returns a list of squares attacked by the color that isn't moving
     def getAttackedSquares(self) -> list:
-        return self.attacked_squares
+        counts = self.attack_counts["Black" if self.turn else "White"]
+        return [(sq % 8, sq // 8) for sq in range(64) if counts[sq]]
+    
+    # Returns whether any piece of the given color attacks a square
+    def isAttacked(self, pos: tuple, color: str) -> bool:
+        return self.attack_counts[color][pos[1] * 8 + pos[0]] != 0
     
     def findPiece(self, piece: Piece) -> tuple:
+        # Pieces and the duck are looked up in the piece lists, only empty squares need a scan
+        if piece.type_id == DUCK:
+            return (self.duck_pos[1], self.duck_pos[0])
+        if piece.code != 0:
+            squares = self.piece_squares[piece.color][piece.type_id]
+            return divmod(min(squares), 8) if squares else (-1, -1)
         for i in range(len(self.board)):
             for j in range(len(self.board[i])):
-                if (str(self.board[i][j]) == str(piece)):
+                if self.board[i][j] == piece:
                     return (i, j)
         return (-1, -1)
     
+    # Returns "win" once the side to move has lost its king, "draw" if the game is drawn (see getDrawReason) and None
+    # while it goes on
     def getGameState(self) -> str:
-        if self.findPiece(Piece("King", self.getTurn())) == (-1, -1):
+        if self.isKingTaken():
             return "win"
+        if self.getDrawReason() != None:
+            return "draw"
+    
+    # Returns whether the side to move has lost its king
+    def isKingTaken(self) -> bool:
+        return self.kings[self.getTurn()] == None
+    
+    # Returns "fifty moves", "repetition" or "no moves" if the game is drawn at the start of this turn, otherwise None
+    def getDrawReason(self) -> str:
+        if self.duck_turn:
+            return None
+        if self.halfmove >= 100:
+            return "fifty moves"
+        if self.repetitions.get(self.key, 0) >= 3:
+            return "repetition"
+        if not self.hasPieceMoves():
+            return "no moves"
     
-    # Returns a dictionary of all possible moves, for testing purposes
+    # Returns whether the fifty move rule or threefold repetition draws the game, from the halfmove clock and the
+    # repetition counts that movePiece and unmakeMove keep up to date
+    def isDrawByRule(self) -> bool:
+        return self.halfmove >= 100 or self.repetitions.get(self.key, 0) >= 3
+    
+    # Returns whether the side to move has a piece move. A new position is scanned until the first move turns up, and
+    # the answer is cached by key so asking again about the same position doesn't scan
+    def hasPieceMoves(self) -> bool:
+        if self.mobility_key != self.key:
+            self.has_moves = next(self.generateMoves(piece_moves_only=True), None) != None
+            self.mobility_key = self.key
+        return self.has_moves
+    
+    # Returns a dictionary of all possible moves, for testing purposes. With no color it includes both colors and the duck
     def getAllMoves(self, color: str or bool = None) -> dict:
         if type(color) == bool:
             color = "White" if color else "Black"
-        elif not type(color) == str:
-            raise(TypeError("Invalid color type: " + type(color)))
+        elif not (color == None or type(color) == str):
+            raise(TypeError(f"Invalid color type: {type(color)}"))
         moves = {}
+        if color == "White" or color == "Black":
+            # Pieces that can't move still get an empty list
+            for pos in self.getPieces(color):
+                moves[pos] = []
+            for pos, dest in self.generateMoves(color, piece_moves_only=True):
+                moves[pos].append(dest)
+            return moves
         for y, row in enumerate(self.board):
             for x, piece in enumerate(row):
-                if piece.getType() != None and (color == None or piece.getColor() == color):
+                if piece.code != 0 and (color == None or piece.color == color):
                     moves[(x, y)] = self.getAvailableMoves((x, y))
         return moves
+    
+    # Lazily yields the moves of color (the side to move by default) as compound moves, ((pos, dest), duck_dest), without
+    # changing the board. captures_only skips piece moves that don't take anything, piece_moves_only yields just the
+    # (pos, dest) piece moves, and stable sorts destinations and duck squares into board order rather than generation order
+    def generateMoves(self, color: str = None, captures_only: bool = False, piece_moves_only: bool = False, stable: bool = False):
+        if color == None:
+            color = self.getTurn()
+        empty = None
+        for pos in self.getPieces(color):
+            dests = self.iterPieceMoves(pos)
+            if stable:
+                dests = sorted(dests, key=lambda dest: (dest[1], dest[0]))
+            for dest in dests:
+                passant_capture = self.getPassantCapture(pos, dest)
+                if captures_only and passant_capture == None and self.getPiece(dest).code == 0:
+                    continue
+                if piece_moves_only:
+                    yield (pos, dest)
+                    continue
+                # After the move the duck can go on any empty square but dest, or on the squares the move empties
+                if empty == None:
+                    empty = self.getEmptySquares()
+                if stable:
+                    ducks = sorted([square for square in empty if square != dest] + [pos] + ([passant_capture] if passant_capture else []), key=lambda square: (square[1], square[0]))
+                else:
+                    ducks = itertools.chain((square for square in empty if square != dest), (pos,), (passant_capture,) if passant_capture else ())
+                for duck in ducks:
+                    yield ((pos, dest), duck)
+    
+    # Returns the square of the pawn a move would take en passant, or None if it isn't an en passant capture
+    def getPassantCapture(self, pos: tuple, dest: tuple) -> tuple:
+        piece = self.getPiece(pos)
+        if piece.type_id == PAWN and dest[0] != pos[0] and self.getPiece(dest).code == 0:
+            return (dest[0], dest[1] + 1) if piece.color_id == WHITE else (dest[0], dest[1] - 1)
+        return None
+    
+    # Returns whether the duck can go on a square after the piece move (pos, dest), the same squares generateMoves gives
+    def isDuckSquare(self, pos: tuple, dest: tuple, duck: tuple) -> bool:
+        if duck == pos or duck == self.getPassantCapture(pos, dest):
+            return True
+        return duck != dest and self.getPiece(duck).code == 0
+    
+    # Returns every empty square on the 8x8 board, in board order
+    def getEmptySquares(self) -> list:
+        return [(x, y) for y in range(8) for x, piece in enumerate(self.board[y]) if piece.code == 0]
+    
+    # Returns the positions of a color's pieces in board order, optionally only those of one type
+    def getPieces(self, color: str, piece_type: str = None) -> list:
+        if piece_type != None:
+            squares = sorted(self.piece_squares[color][TYPES.index(piece_type)])
+        else:
+            squares = sorted(itertools.chain(*self.piece_squares[color]))
+        return [(sq % 8, sq // 8) for sq in squares]
                         
     # Returns a FEN string of the current position
     def getFEN(self) -> str:
-        fen = ""
-        was_space = False
-        for y in range(8):
+        rows = []
+        for row in self.board[:8]:
+            text = ""
             spaces = 0
-            for x in range(8):
-                if self.getPiece((x, y)).getType() != None:
-                    index = str(self.getPiece((x, y))).split()
-                    index.reverse()
-                    if was_space:
-                        fen += str(spaces)
-                        spaces = 0
-                    fen += (list(FEN_SYMBOLS)[list(FEN_SYMBOLS.values()).index(index)])
-                    was_space = False
-                else:
+            for piece in row:
+                char = CODE_FEN[piece.code]
+                if char == None:
                     spaces += 1
-                    was_space = True
+                else:
+                    if spaces != 0:
+                        text += str(spaces)
+                        spaces = 0
+                    text += char
             if spaces != 0:
-               fen += str(spaces)
-            if y != 7:
-                fen += "/"
-        fen += " w" if self.turn else " b"
-        fen += f" KQkq {self.passant} {self.halfmove} {self.fullmove}"
-        return fen
+                text += str(spaces)
+            rows.append(text)
+        return f"{'/'.join(rows)} {'w' if self.turn else 'b'} {self.castling} {self.passant or '-'} {self.halfmove} {self.fullmove}"
     
     # Returns all legal moves for the piece at a given position
     def getAvailableMoves(self, pos: tuple, attacking:bool = False) -> list:
-        piece = self.getPiece(pos)
-        color = piece.getColor()
-        attackable_color = "White" if color == "Black" else "Black" 
-        piece.clearAvailableMoves()
+        return list(self.iterPieceMoves(pos, attacking))
+    
+    # Yields the legal destinations of the piece at a given position one at a time. With attacking, yields every square
+    # the piece attacks instead, own pieces included
+    def iterPieceMoves(self, pos: tuple, attacking:bool = False):
+        board = self.board
+        piece = board[pos[1]][pos[0]]
+        piece_type = piece.type_id
+        color = piece.color_id
+        attackable_color = BLACK if color == WHITE else WHITE
         x, y = pos
 
         # Duck Movement
-        if piece.getType() == "Duck":
-            for i in range(len(self.board)):
-                for j in range(len(self.board[i])):
-                    if (self.board[i][j].getType() == None):
-                        piece.addMove((j, i))
+        if piece_type == DUCK:
+            # Only the 8x8 board, the duck can't go back to its starting square off the board
+            yield from self.getEmptySquares()
 
         # Pawn Movement
-        elif piece.getType() == "Pawn":
+        elif piece_type == PAWN:
             # Adds the diagonal options for attack purposes
             if attacking:
-                if color == "Black":
-                    if x < 7 and y < 7:
-                        piece.addMove((x + 1, y + 1))
-                    if x > 0 and y < 7:
-                        piece.addMove((x - 1, y + 1))
-                else:
-                    if x < 7 and y > 0:
-                        piece.addMove((x + 1, y - 1))
-                    if x > 0 and y > 0:
-                        piece.addMove((x - 1, y - 1))
+                yield from PAWN_ATTACKS[color][y * 8 + x]
             # Normal movement
             else:
                 for i in range(-1, 2):
-                    checked_move = (x + i, y + 1) if color == "Black" else (x + i, y - 1)
+                    checked_move = (x + i, y + 1) if color == BLACK else (x + i, y - 1)
                     if checked_move[0] >= 0 and checked_move[0] < 8 and checked_move[1] >= 0 and checked_move[1] < 8:
+                        target = board[checked_move[1]][checked_move[0]]
                         # Check Diagonal attacks
-                        if ((i != 0 and self.getPiece(checked_move).getType() != None) and (self.getPiece(checked_move).getColor() == attackable_color)):
-                            piece.addMove(checked_move)
+                        if i != 0 and target.color_id == attackable_color:
+                            yield checked_move
                         # Check forward movement
-                        elif i == 0 and self.getPiece(checked_move).getType() == None:
-                            piece.addMove(checked_move)
+                        elif i == 0 and target.code == 0:
+                            yield checked_move
                             # Check if its White, one the starting pawn row, and that its moving to an empty space
-                            if y == 6 and color == "White" and self.getPiece((x, y - 2)).getType() == None:
-                                piece.addMove((x, y - 2))
+                            if y == 6 and color == WHITE and board[y - 2][x].code == 0:
+                                yield (x, y - 2)
                             # Same thing but for black
-                            elif y == 1 and color == "Black" and self.getPiece((x, y + 2)).getType() == None:
-                                piece.addMove((x, y + 2))
-                        # Check En Passant
-                        elif self.passant == self.getNotation(checked_move):
-                            piece.addMove(checked_move)
+                            elif y == 1 and color == BLACK and board[y + 2][x].code == 0:
+                                yield (x, y + 2)
+                        # Check En Passant. The square has to be empty so the duck can't be taken, and on the enemy's
+                        # side of the board so the pawn that made it (or the duck next to it) isn't
+                        elif target.code == 0 and checked_move[1] == (2 if color == WHITE else 5) and self.passant == self.getNotation(checked_move):
+                            yield checked_move
 
         # Knight Movement
-        if piece.getType() == "Knight":
-            # Uses itertools itertools.product to get (x - 1,y - 2),(x - 1,y + 2),(x + 1,y - 2), etc.
-            for checked_move in list(itertools.product([x - 1, x + 1],[y - 2, y + 2])) + list(itertools.product([x - 2, x + 2], [y - 1, y + 1])):
-                # Checks if move is in bounds
-                if checked_move[0] >= 0 and checked_move[0] < 8 and checked_move[1] >= 0 and checked_move[1] < 8:
-                    # Checks if area is occupied by a piece of the same color
-                    if self.getPiece(checked_move).getColor() == attackable_color or attacking or self.getPiece(checked_move).getColor() == None:
-                        piece.addMove(checked_move)
+        elif piece_type == KNIGHT:
+            for checked_move in KNIGHT_TARGETS[y * 8 + x]:
+                # Checks if area is occupied by a piece of the same color
+                target_color = board[checked_move[1]][checked_move[0]].color_id
+                if target_color == attackable_color or attacking or target_color == None:
+                    yield checked_move
         
-        # Rook Movement
-        if piece.getType() == "Rook":
-            # Generates moves along the vertical, then horizontal and splits them at the piece's position
-            # The left/top movement is reversed, so that it can break when it reaches a piece of the same color
-            for raycast in itertools.chain(raycastFrom([(x, i) for i in range(8)], pos), raycastFrom([(i, y) for i in range(8)], pos)):
-                for checked_move in raycast:
-                    if self.getPiece(checked_move).getType() != None:
+        # Rook, Bishop and Queen Movement
+        elif piece_type == ROOK or piece_type == BISHOP or piece_type == QUEEN:
+            # Walks out along each ray until it reaches a piece
+            for ray in RAYS[y * 8 + x][SLIDER_RAYS[piece_type]]:
+                for checked_move in ray:
+                    target = board[checked_move[1]][checked_move[0]]
+                    if target.code != 0:
                         # If the piece isn't of the same color, it adds a move at that positon
-                        if self.getPiece(checked_move).getColor() == attackable_color or attacking:
-                            piece.addMove(checked_move)
+                        if target.color_id == attackable_color or attacking:
+                            yield checked_move
                         # If it ran into a piece, it stops the loop
                         break
-                    else:
-                        piece.addMove(checked_move)
-        
-        # Bishop Movement
-        if piece.getType() == "Bishop":
-            # Generates moves along two diagonals, one in the increasing x, increasing y and the other in the increasing x, decreasing y
-            # Then uses raycast from to order the points from the center in all four directs, seperationg them into 4 lists that are combined using itertools.chain
-            for raycast in itertools.chain(raycastFrom([(x + i, y + i) for i in range(-7, 8)], pos), raycastFrom([(x + i, y - i) for i in range(-7, 8)], pos)):
-                for checked_move in raycast:
-                    # Check if move is in bounds
-                    if checked_move[0] >= 0 and checked_move[0] < 8 and checked_move[1] >= 0 and checked_move[1] < 8:
-                        if self.getPiece(checked_move).getType() != None:
-                            # If the piece isn't of the same color, it adds a move at that positon
-                            if self.getPiece(checked_move).getColor() == attackable_color or attacking:
-                                piece.addMove(checked_move)
-                            # If it ran into a piece, it stops the loop
-                            break
-                        else:
-                            piece.addMove(checked_move)
-        
-        # Queen Movement
-        if piece.getType() == "Queen":
-            # Generates moves along two diagonals, one in the increasing x, increasing y and the other in the increasing x, decreasing y
-            # Then generates moves along the straights, same code as rook
-            # First is (x, +y), then (+x, y) then (+x, +y), then (+x, -y)
-            for raycast in itertools.chain(raycastFrom([(x, i) for i in range(8)], pos), raycastFrom([(i, y) for i in range(8)], pos), raycastFrom([(x + i, y + i) for i in range(-7, 8)], pos), raycastFrom([(x + i, y - i) for i in range(-7, 8)], pos)):
-                for checked_move in raycast:
-                    # Check if move is in bounds
-                    if checked_move[0] >= 0 and checked_move[0] < 8 and checked_move[1] >= 0 and checked_move[1] < 8:
-                        if self.getPiece(checked_move).getType() != None:
-                            # If the piece isn't of the same color, it adds a move at that positon
-                            if self.getPiece(checked_move).getColor() == attackable_color or attacking:
-                                piece.addMove(checked_move)
-                            # If it ran into a piece, it stops the loop
-                            break
-                        else:
-                            piece.addMove(checked_move)
+                    yield checked_move
         
         # King Movement
-        if piece.getType() == "King":
-            # Iterates through a 3x3 square around the king
-            for x_offset, y_offset in itertools.product(range(-1, 2), range(-1, 2)):
-                checked_move = (x + x_offset, y + y_offset)
-                # Checks if the king is trying to move into Check
-                if checked_move not in self.attacked_squares:
-                    # Checks if move is the current position of the king
-                    if checked_move != (x, y):
-                        # Check if move is in bounds
-                        if checked_move[0] >= 0 and checked_move[0] < 8 and checked_move[1] >= 0 and checked_move[1] < 8:
-                            # Checks if area is occupied by a piece of the same color
-                            if self.getPiece(checked_move).getColor() == attackable_color or attacking:
-                                piece.addMove(checked_move)
-                                
-        return piece.available_moves
+        elif piece_type == KING:
+            if attacking:
+                yield from KING_TARGETS[y * 8 + x]
+            else:
+                enemy_attacks = self.attack_counts[COLORS[attackable_color]]
+                for checked_move in KING_TARGETS[y * 8 + x]:
+                    # Checks if the king is trying to move into Check, or onto its own piece or the duck
+                    if not enemy_attacks[checked_move[1] * 8 + checked_move[0]] and board[checked_move[1]][checked_move[0]].color_id in (attackable_color, None):
+                        yield checked_move
     
     # Moves Piece from target pos to dest
     def movePiece(self, pos:tuple, dest:tuple) -> None:
-        piece, color = self.getPiece(pos).getType(), self.getPiece(pos).getColor()
+        piece, color = self.getPiece(pos).type_id, self.getPiece(pos).color_id
+        self.key ^= self.getStateKey()
 
         # Duck Movement
-        if piece == "Duck":
+        if piece == DUCK:
             # Actually move piece
-            self.board[dest[1]][dest[0]] = self.getPiece(pos)
-            self.board[pos[1]][pos[0]] = Piece(None, None)
+            self.changeSquares([(dest, self.getPiece(pos)), (pos, EMPTY)])
             
             # Switch turn
             self.turn = not self.turn
+            self.duck_turn = False
             
-            # Increment fullmove
-            if self.getPiece(dest).getColor() == "Black":
+            # Increment fullmove once Black has finished their turn
+            if self.turn:
                 self.fullmove += 1
             
             # Make En Passant Expire
@@ -315,14 +456,11 @@ class Board():
             else:
                 self.passant = None
             
-            # Recalculate all attacked positions
-            self.setAttackedSquares()
-            
             self.duck_pos = dest
         
         else:
             # Reset halfmoves if pawn move
-            if piece == "Pawn":
+            if piece == PAWN:
                 self.halfmove = 0
                 # En passant handling
                 if pos[1] + 2 == dest[1]:
@@ -333,64 +471,228 @@ class Board():
                     self.passant_time = 1
                     
             # Reset halfmoves if capture, otherwise incriment
-            elif self.getPiece(dest).getType() != None:
+            elif self.getPiece(dest).code != 0:
                 self.halfmove = 0
             else:
                 self.halfmove += 1
             
+            changes = [(dest, self.getPiece(pos)), (pos, EMPTY)]
+            
             # En Passont movement
-            if piece == "Pawn":
-                if self.getPiece(dest).getType() == None and dest[0] != pos[0]:
-                    if color == "White":
-                        self.board[dest[1] + 1][dest[0]] = Piece(None, None)
+            if piece == PAWN:
+                if self.getPiece(dest).code == 0 and dest[0] != pos[0]:
+                    if color == WHITE:
+                        changes.append(((dest[0], dest[1] + 1), EMPTY))
                     else:
-                        self.board[dest[1] - 1][dest[0]] = Piece(None, None)
+                        changes.append(((dest[0], dest[1] - 1), EMPTY))
             
             # Actually move piece
-            self.board[dest[1]][dest[0]] = self.getPiece(pos)
-            self.board[pos[1]][pos[0]] = Piece(None, None)
+            self.changeSquares(changes)
+            self.duck_turn = True
+        
+        self.key ^= self.getStateKey()
+        # A finished turn adds the position the next one starts from
+        if not self.duck_turn:
+            self.repetitions[self.key] = self.repetitions.get(self.key, 0) + 1
             
-    # Generates all squares that are under attack by the opposing color
+    # Plays a move given as (pos, dest) and pushes an undo record for unmakeMove
+    def makeMove(self, move: tuple) -> None:
+        pos, dest = move
+        passant_capture = None
+        # En passant takes the pawn behind the empty destination square
+        captured_pos = self.getPassantCapture(pos, dest)
+        if captured_pos != None:
+            passant_capture = (captured_pos, self.getPiece(captured_pos))
+        self.history.append(MoveRecord(pos, dest, self.getPiece(dest), passant_capture, self.turn, self.duck_turn, self.castling, self.passant, self.passant_time, self.halfmove, self.fullmove, self.duck_pos, self.key))
+        self.movePiece(pos, dest)
+    
+    # Takes back the last move played with makeMove
+    def unmakeMove(self) -> None:
+        record = self.history.pop()
+        if not self.duck_turn:
+            self.forgetPosition()
+        changes = [(record.pos, self.getPiece(record.dest)), (record.dest, record.captured)]
+        if record.passant_capture != None:
+            changes.append(record.passant_capture)
+        self.changeSquares(changes)
+        self.turn = record.turn
+        self.duck_turn = record.duck_turn
+        self.castling = record.castling
+        self.passant = record.passant
+        self.passant_time = record.passant_time
+        self.halfmove = record.halfmove
+        self.fullmove = record.fullmove
+        self.duck_pos = record.duck_pos
+        self.key = record.key
+    
+    # Takes the current position back out of the repetition counts, when the duck move that reached it is undone
+    def forgetPosition(self) -> None:
+        count = self.repetitions.get(self.key, 0) - 1
+        if count > 0:
+            self.repetitions[self.key] = count
+        else:
+            self.repetitions.pop(self.key, None)
+    
+    # Puts pieces on squares, given as a list of (pos, piece), and updates the attack maps along the way.
+    # Only the pieces on those squares and the sliders looking through them have their attacks recomputed
+    def changeSquares(self, changes: list) -> None:
+        affected = set()
+        for pos, _ in changes:
+            # The off board duck square doesn't take part in attacks
+            if pos[1] < 8:
+                affected.add(pos)
+                affected.update(self.findSliders(pos))
+        for pos in affected:
+            self.removeAttacks(pos)
+        
+        for pos, piece in changes:
+            old = self.board[pos[1]][pos[0]]
+            if old.type_id == KING and self.kings[old.color] == pos:
+                self.kings[old.color] = None
+            if piece.type_id == KING:
+                self.kings[piece.color] = pos
+            if pos[1] < 8:
+                sq = pos[1] * 8 + pos[0]
+                self.key ^= ZOBRIST_CODES[old.code][sq] ^ ZOBRIST_CODES[piece.code][sq]
+                if old.color_id == WHITE or old.color_id == BLACK:
+                    self.piece_squares[old.color][old.type_id].discard(sq)
+                if piece.color_id == WHITE or piece.color_id == BLACK:
+                    self.piece_squares[piece.color][piece.type_id].add(sq)
+            self.board[pos[1]][pos[0]] = piece
+        
+        for pos in affected:
+            self.addAttacks(pos)
+    
+    # Returns the positions of every rook, bishop and queen whose line of sight reaches a square
+    def findSliders(self, pos: tuple) -> list:
+        sliders = []
+        for direction, ray in enumerate(RAYS[pos[1] * 8 + pos[0]]):
+            slider_type = ROOK if direction < 4 else BISHOP
+            for x, y in ray:
+                piece_type = self.board[y][x].type_id
+                if piece_type != None:
+                    if piece_type == slider_type or piece_type == QUEEN:
+                        sliders.append((x, y))
+                    break
+        return sliders
+    
+    # Adds the attacks of the piece at a position to the attack maps
+    def addAttacks(self, pos: tuple) -> None:
+        piece = self.getPiece(pos)
+        if piece.code == 0 or piece.type_id == DUCK:
+            return
+        counts = self.attack_counts[piece.color]
+        attacks = [y * 8 + x for x, y in self.iterPieceMoves(pos, True)]
+        for sq in attacks:
+            counts[sq] += 1
+        self.piece_attacks[pos[1] * 8 + pos[0]] = attacks
+    
+    # Takes the attacks of the piece at a position back out of the attack maps
+    def removeAttacks(self, pos: tuple) -> None:
+        attacks = self.piece_attacks[pos[1] * 8 + pos[0]]
+        if attacks == None:
+            return
+        counts = self.attack_counts[self.getPiece(pos).color]
+        for sq in attacks:
+            counts[sq] -= 1
+        self.piece_attacks[pos[1] * 8 + pos[0]] = None
+            
+    # Rebuilds the piece lists and the attack maps of both colors from scratch
     def setAttackedSquares(self) -> None:
-        self.attacked_squares = []
-        for y, row in enumerate(self.board):
-            for x, piece in enumerate(row):
-                if piece.getType() != None and piece.getColor() != self.getTurn():
-                    for square in self.getAvailableMoves((x, y), True):
-                        self.attacked_squares.append(square)
+        self.attack_counts = {"White": [0] * 64, "Black": [0] * 64}
+        self.piece_attacks = [None] * 64
+        self.kings = {"White": None, "Black": None}
+        self.piece_squares = {"White": [set() for i in range(6)], "Black": [set() for i in range(6)]}
+        for y in range(8):
+            for x in range(8):
+                piece = self.board[y][x]
+                if piece.color_id == WHITE or piece.color_id == BLACK:
+                    self.piece_squares[piece.color][piece.type_id].add(y * 8 + x)
+                    if piece.type_id == KING:
+                        self.kings[piece.color] = (x, y)
+        for color in ("White", "Black"):
+            for pos in self.getPieces(color):
+                self.addAttacks(pos)
     
-    # Sets the board state to a specific FEN Notation
+    # Sets the board state to a specific FEN Notation, FENs seen recently are copied from loadFEN's cache rather than parsed again
     def setFEN(self, fen:str) -> None:
-        fen = fen.split()
+        self.setPosition(loadFEN(fen))
+    
+    # Parses a FEN onto the board and works out the attack maps, piece lists and key from scratch
+    def parseFEN(self, fen:str) -> None:
+        fields = validateFEN(fen)
+        # Drop the off board duck square left by an earlier position
+        del self.board[8:]
+        self.duck_pos = (0, 8)
         
         x, y = 0, 0
-        for char in fen[0]:
+        for char in fields[0]:
             if char == '/':
                 y += 1
                 x = 0
             elif char.isdigit(): 
                 for i in range(int(char)):
-                    self.board[y][x] = Piece(None, None)
+                    self.board[y][x] = EMPTY
                     x += 1
             else:
-                self.board[y][x] = Piece(FEN_SYMBOLS[char][0], FEN_SYMBOLS[char][1])
+                self.board[y][x] = FEN_PIECES[char]
                 if char == "D":
                     self.duck_pos = (x, y)
                 x += 1
-                    
+                
         # The non-piece stuff
-        self.turn = fen[1] == 'w'
-        self.castling = fen[2]
-        self.passant = fen[3]
-        self.halfmove = int(fen[4])
-        self.fullmove = int(fen[5])
+        self.turn = fields[1] == 'w'
+        self.castling = fields[2]
+        self.passant = fields[3]
+        self.halfmove = int(fields[4])
+        self.fullmove = int(fields[5])
+        # A double push by Black is still open on White's turn, see movePiece
+        self.passant_time = 1 if self.passant != '-' and self.turn else 0
+        self.duck_turn = False
+        self.history = []
 
-        if self.findPiece(Piece("Duck", "Duck")) == (-1, -1):
-            self.board.append([Piece("Duck", "Duck")])
+        # Ducks that haven't been placed yet wait at (0, 8)
+        if self.duck_pos == (0, 8):
+            self.board.append([FEN_PIECES["D"]])
         
         self.setAttackedSquares()
-
-
+        self.key = self.computeKey()
+    
+    # Returns an immutable snapshot of the position, without the move history
+    def getPosition(self) -> Position:
+        return Position(
+            tuple(self.board[y][x] for y in range(8) for x in range(8)),
+            self.turn, self.castling, self.passant, self.passant_time, self.halfmove, self.fullmove, self.duck_pos, self.key,
+            (self.kings["White"], self.kings["Black"]),
+            (tuple(self.attack_counts["White"]), tuple(self.attack_counts["Black"])),
+            tuple(None if attacks == None else tuple(attacks) for attacks in self.piece_attacks),
+            tuple(tuple(frozenset(squares) for squares in self.piece_squares[color]) for color in ("White", "Black")),
+        )
+    
+    # Loads a snapshot from getPosition, clearing the move history
+    def setPosition(self, position: Position) -> None:
+        squares = position.squares
+        self.board = [list(squares[y * 8:y * 8 + 8]) for y in range(8)]
+        if position.duck_pos == (0, 8):
+            self.board.append([FEN_PIECES["D"]])
+        self.turn = position.turn
+        self.duck_turn = False
+        self.castling = position.castling
+        self.passant = position.passant
+        self.passant_time = position.passant_time
+        self.halfmove = position.halfmove
+        self.fullmove = position.fullmove
+        self.duck_pos = position.duck_pos
+        self.key = position.key
+        self.kings = {"White": position.kings[0], "Black": position.kings[1]}
+        self.attack_counts = {"White": list(position.attack_counts[0]), "Black": list(position.attack_counts[1])}
+        # The per piece lists are only ever replaced, never changed in place, so the tuples can be shared
+        self.piece_attacks = list(position.piece_attacks)
+        self.piece_squares = {color: [set(squares) for squares in position.piece_squares[index]] for index, color in enumerate(("White", "Black"))}
+        self.history = []
+        self.repetitions = {self.key: 1}
+        self.mobility_key = None
+    
     # Represent Board as a string, mostly for debugging
     def __repr__(self) -> str:
         if self.turn:
@@ -419,4 +721,34 @@ class Board():
                 # Add Pieces and shit to the table
                 output += f"{self.getPiece((column_index, row_index))} | "
             output += "\n"    
-        return(output)
\ No newline at end of file
+        return(output)
+
+# Checks a FEN can be parsed, raising InvalidFenException if it can't, and returns its fields. Both backends parse
+# through this, so they reject the same FENs
+def validateFEN(fen: str) -> list:
+    fields = fen.split()
+    if len(fields) != 6 or fields[1] not in ("w", "b") or not fields[4].isdigit() or not fields[5].isdigit():
+        raise InvalidFenException(fen)
+    ranks = fields[0].split("/")
+    if len(ranks) != 8:
+        raise InvalidFenException(fen)
+    for rank in ranks:
+        width = 0
+        for char in rank:
+            if char in "12345678":
+                width += int(char)
+            elif char in FEN_PIECES:
+                width += 1
+            else:
+                raise InvalidFenException(fen)
+        if width != 8:
+            raise InvalidFenException(fen)
+    return fields
+
+# Returns the parsed snapshot of a FEN, remembering the most recent ones so loading them again is only a copy
+@functools.lru_cache(maxsize=FEN_CACHE_SIZE)
+def loadFEN(fen: str) -> Position:
+    board = Board.__new__(Board)
+    board.board = [[EMPTY] * 8 for y in range(8)]
+    board.parseFEN(fen)
+    return board.getPosition()
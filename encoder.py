@@ -0,0 +1,107 @@
+import numpy as np
+import duck_chess
+from duck_chess import FEN_PIECES, NOTATION
+
+# Plane order of an encoded position. Pieces come first, in piece code order (code - 1), so a board of codes
+# one-hot encodes in a single comparison
+PLANES = [f"{color} {piece_type}" for color in ("White", "Black") for piece_type in duck_chess.TYPES[:6]] + [
+    "Duck",
+    "White to move",
+    "Duck to move",
+    "En passant",
+    "White kingside castling",
+    "White queenside castling",
+    "Black kingside castling",
+    "Black queenside castling",
+]
+PIECE_PLANES = 13
+TURN_PLANE, DUCK_TURN_PLANE, PASSANT_PLANE, CASTLING_PLANE = 13, 14, 15, 16
+CASTLING = "KQkq"
+
+# Turns the board field of a FEN straight into code bytes: pieces become their code and digits become that many empty
+# squares. The rank separators are kept so the rank widths can be checked, a valid board comes out as 8 ranks of 8
+_FEN_TRANSLATION = str.maketrans({**{char: chr(piece.code) for char, piece in FEN_PIECES.items()}, **{str(i): "\0" * i for i in range(1, 9)}})
+# Everything that can appear in the board field, translate passes anything else straight through
+_FEN_CHARS = frozenset(FEN_PIECES) | frozenset("12345678/")
+_CODES = np.arange(1, PIECE_PLANES + 1, dtype=np.uint8)
+
+
+# Returns the square index (y * 8 + x) of an en passant field, or -1 if there isn't one
+def passantSquare(passant: str) -> int:
+    if passant in (None, "-"):
+        return -1
+    return NOTATION.index(passant[0]) + (8 - int(passant[1])) * 8
+
+# Returns the 64 piece codes of a board, in y * 8 + x order
+def boardCodes(board: duck_chess.Board) -> bytes:
+    return bytes([piece.code for row in board.board[:8] for piece in row])
+
+# Returns the piece codes of a batch of boards and FEN strings as an (N, 64) uint8 array, along with
+# the side to move, duck turn, en passant square and castling rights of each one
+def readBatch(boards: list) -> tuple:
+    codes = bytearray()
+    turn, duck_turn, passant, castling = [], [], [], []
+    for board in boards:
+        if isinstance(board, str):
+            fields = board.split()
+            if len(fields) != 6:
+                raise duck_chess.InvalidFenException(board)
+            if not _FEN_CHARS.issuperset(fields[0]):
+                raise duck_chess.InvalidFenException(board)
+            squares = fields[0].translate(_FEN_TRANSLATION)
+            if len(squares) != 71 or squares[8::9] != "///////":
+                raise duck_chess.InvalidFenException(board)
+            codes += squares.replace("/", "").encode("latin-1")
+            turn.append(fields[1] == "w")
+            duck_turn.append(False)
+            passant.append(passantSquare(fields[3]))
+            castling.append(fields[2])
+        else:
+            codes += boardCodes(board)
+            turn.append(board.turn)
+            duck_turn.append(board.duck_turn)
+            passant.append(passantSquare(board.passant))
+            castling.append(board.castling)
+    castling = np.array([[char in rights for char in CASTLING] for rights in castling], dtype=bool).reshape(-1, 4)
+    return np.frombuffer(bytes(codes), dtype=np.uint8).reshape(-1, 64), np.array(turn, dtype=bool), np.array(duck_turn, dtype=bool), np.array(passant, dtype=np.int64), castling
+
+# Builds the (N, len(PLANES), 8, 8) planes from arrays like readBatch returns, without looping over boards
+def encodeArrays(codes: np.ndarray, turn: np.ndarray, duck_turn: np.ndarray, passant: np.ndarray, castling: np.ndarray, dtype=np.uint8) -> np.ndarray:
+    count = codes.shape[0]
+    planes = np.zeros((count, len(PLANES), 64), dtype=dtype)
+    planes[:, :PIECE_PLANES] = codes[:, None, :] == _CODES[None, :, None]
+    planes[:, TURN_PLANE] = turn[:, None]
+    planes[:, DUCK_TURN_PLANE] = duck_turn[:, None]
+    has_passant = np.flatnonzero(passant >= 0)
+    planes[has_passant, PASSANT_PLANE, passant[has_passant]] = 1
+    planes[:, CASTLING_PLANE:CASTLING_PLANE + 4] = castling[:, :, None]
+    return planes.reshape(count, len(PLANES), 8, 8)
+
+# Encodes a board, a FEN string, or a list of them. A single position still comes back with a batch dimension of 1
+def encode(boards, dtype=np.uint8) -> np.ndarray:
+    if isinstance(boards, (str, duck_chess.Board)):
+        boards = [boards]
+    return encodeArrays(*readBatch(boards), dtype=dtype)
+
+# Returns the legal move masks of a batch: an (N, 64, 64) mask of piece moves indexed [from, to], and an
+# (N, 64) mask of duck squares. Before the piece move the duck mask is the empty squares, which the duck can
+# use after any move except the one the piece lands on, plus the square the piece leaves
+def legalMasks(boards) -> tuple:
+    if isinstance(boards, (str, duck_chess.Board)):
+        boards = [boards]
+    boards = [duck_chess.Board(board) if isinstance(board, str) else board for board in boards]
+    moves = np.zeros((len(boards), 64 * 64), dtype=np.uint8)
+    for index, board in enumerate(boards):
+        if board.duck_turn or board.isKingTaken():
+            continue
+        squares = [(pos[1] * 8 + pos[0]) * 64 + dest[1] * 8 + dest[0] for pos, dest in board.generateMoves(piece_moves_only=True)]
+        moves[index, squares] = 1
+    codes = np.frombuffer(b"".join(boardCodes(board) for board in boards), dtype=np.uint8).reshape(-1, 64)
+    return moves.reshape(-1, 64, 64), (codes == 0).astype(np.uint8)
+
+# Encodes a batch and works out its legal move masks, returning (planes, piece move mask, duck mask)
+def encodeWithMasks(boards, dtype=np.uint8) -> tuple:
+    if isinstance(boards, (str, duck_chess.Board)):
+        boards = [boards]
+    boards = [duck_chess.Board(board) if isinstance(board, str) else board for board in boards]
+    return (encode(boards, dtype),) + legalMasks(boards)
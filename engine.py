@@ -0,0 +1,95 @@
+import multiprocessing, queue
+import duck_chess
+from search import Search, SearchResult
+
+# Commands the GUI sends the worker process: ("search", id, fen, depth, movetime, nodes) or ("quit",).
+# The worker answers with ("info", id, SearchResult) after every finished iteration and ("done", id, SearchResult) at the end
+
+
+class _StopFlag():
+    # Set once the GUI has stopped search id or anything after it, so one shared number covers cancelling old searches
+    # and "move now" without a race between clearing and setting an Event
+    def __init__(self, stopped, search_id: int) -> None:
+        self.stopped = stopped
+        self.search_id = search_id
+
+    def is_set(self) -> bool:
+        return self.stopped.value >= self.search_id
+
+# Runs in the worker process, searching every position it's sent with one Search, so the transposition table carries over
+def _engineLoop(commands, results, stopped, backend: type, hash_mb: float, duck_width: int) -> None:
+    searcher = Search(backend(), hash_mb, duck_width)
+    while True:
+        command = commands.get()
+        if command[0] == "quit":
+            return
+        _, search_id, fen, depth, movetime, nodes = command
+        stop = _StopFlag(stopped, search_id)
+        # Searches cancelled before the worker got to them are skipped
+        if stop.is_set():
+            continue
+        searcher.board = backend(fen)
+        result = searcher.search(depth, movetime, nodes, lambda info: results.put(("info", search_id, info)), stop)
+        results.put(("done", search_id, result))
+
+class EngineWorker():
+    # Searches positions in a background process so the GUI keeps running while the engine thinks. Results are picked
+    # up with poll, which never blocks
+    def __init__(self, backend: type = duck_chess.Board, hash_mb: float = 16, duck_width: int = 6) -> None:
+        context = multiprocessing.get_context()
+        self.commands = context.Queue()
+        self.results = context.Queue()
+        self.stopped = context.Value("q", 0, lock=False)
+        self.process = context.Process(target=_engineLoop, args=(self.commands, self.results, self.stopped, backend, hash_mb, duck_width), daemon=True)
+        self.process.start()
+        self.search_id = 0
+        self.thinking = False
+        # The latest iteration of the current search, for showing its principal variation while it runs
+        self.info = None
+
+    # Starts searching a Board or FEN, cancelling the search in progress. With no limits the search runs until moveNow.
+    # Returns the id of the new search
+    def start(self, position, depth: int = None, movetime: float = None, nodes: int = None) -> int:
+        fen = position if type(position) == str else position.getFEN()
+        self.cancel()
+        self.search_id += 1
+        self.thinking = True
+        self.info = None
+        self.commands.put(("search", self.search_id, fen, depth, movetime, nodes))
+        return self.search_id
+
+    # Makes the current search stop and report its best move so far
+    def moveNow(self) -> None:
+        if self.thinking:
+            self.stopped.value = self.search_id
+
+    # Stops the current search and throws away its results
+    def cancel(self) -> None:
+        self.stopped.value = self.search_id
+        self.thinking = False
+        self.info = None
+
+    # Reads everything the worker sent since the last call. Returns the SearchResult of the current search once it's
+    # done, otherwise None. Updates from cancelled searches are dropped
+    def poll(self) -> SearchResult:
+        done = None
+        while True:
+            try:
+                kind, search_id, result = self.results.get_nowait()
+            except queue.Empty:
+                return done
+            if search_id != self.search_id or not self.thinking:
+                continue
+            if kind == "info":
+                self.info = result
+            else:
+                self.thinking = False
+                done = result
+
+    # Stops the worker process
+    def close(self) -> None:
+        self.cancel()
+        self.commands.put(("quit",))
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.terminate()
@@ -0,0 +1,193 @@
+import argparse, gzip, os, sys, time
+from collections import namedtuple
+import duck_chess, encoder
+from parallel import mapTasks
+from uci import moveNotation, parseMove
+
+# Games are stored as text, one block per game with blank lines between them:
+#   [FEN "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"]
+#   [Result "1-0"]
+#   e2e4@e5 d7d5@d4 ...
+# Every ply is the piece move then the duck square, as in the protocol (see uci.py). Files ending in .gz are gzipped
+RESULTS = {"1-0": 1, "0-1": -1, "1/2-1/2": 0, "*": None}
+RESULT_NAMES = {value: text for text, value in RESULTS.items()}
+# Positions encoded at once when replaying with encodings
+ENCODE_BATCH = 4096
+
+# moves are the plies as text, result is 1, 0 or -1 from White's side, or None if the game wasn't finished
+Game = namedtuple("Game", ["fen", "moves", "result"])
+
+
+class GameRecordError(Exception):
+    # Raised when a game file can't be read, or a game in it can't be replayed
+    def __init__(self, message: str, game: int = None, ply: int = None) -> None:
+        self.game = game
+        self.ply = ply
+        if game != None:
+            message = f"Game {game}" + (f", ply {ply}" if ply != None else "") + f": {message}"
+        super().__init__(message)
+
+# Opens a game file as text, through gzip if its name ends in .gz
+def openRecords(path: str, mode: str = "r"):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+class GameWriter():
+    # Appends games to a file one at a time, so nothing but the current game is held in memory
+    def __init__(self, path: str, append: bool = False) -> None:
+        self.file = openRecords(path, "a" if append else "w")
+
+    # moves can be compound moves, ((pos, dest), duck_dest), or already written as text
+    def write(self, moves: list, result: int = None, fen: str = duck_chess.DEFAULT_FEN) -> None:
+        if result not in RESULT_NAMES:
+            raise ValueError(f"Unknown result: {result!r}")
+        if moves and type(moves[0]) != str:
+            board = duck_chess.Board(fen)
+            moves = [moveNotation(board, move) for move in moves]
+        self.file.write(f"[FEN \"{fen}\"]\n[Result \"{RESULT_NAMES[result]}\"]\n{' '.join(moves)}\n\n")
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self) -> "GameWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+# Yields the Games in a file one at a time, reading it line by line. Games whose headers can't be read are skipped,
+# with a GameRecordError for each added to errors if it's given
+def readGames(path: str, errors: list = None):
+    with openRecords(path) as file:
+        headers, moves, index = {}, [], 0
+        for line in file:
+            line = line.strip()
+            if line.startswith("["):
+                # A header after moves starts the next game, even without a blank line between them
+                if moves:
+                    yield from _makeGame(headers, moves, index, errors)
+                    headers, moves, index = {}, [], index + 1
+                name, _, value = line[1:-1].partition(" ")
+                headers[name] = value.strip("\"")
+            elif line:
+                moves.extend(line.split())
+            elif headers or moves:
+                yield from _makeGame(headers, moves, index, errors)
+                headers, moves, index = {}, [], index + 1
+        if headers or moves:
+            yield from _makeGame(headers, moves, index, errors)
+
+# Yields the Game, or nothing if its result can't be read
+def _makeGame(headers: dict, moves: list, index: int, errors: list = None):
+    result = headers.get("Result", "*")
+    if result not in RESULTS:
+        if errors != None:
+            errors.append(GameRecordError(f"Unknown result '{result}'", index))
+        return
+    yield Game(headers.get("FEN", duck_chess.DEFAULT_FEN), moves, RESULTS[result])
+
+# Plays a game through Board.movePiece, yielding the board before every ply. Raises GameRecordError at the first ply
+# that isn't legal
+def replayGame(game: Game, index: int = None):
+    try:
+        board = duck_chess.Board(game.fen)
+    except duck_chess.InvalidFenException as error:
+        raise GameRecordError(str(error), index)
+    for ply, text in enumerate(game.moves):
+        if board.isKingTaken():
+            raise GameRecordError("Moves after a king was taken", index, ply)
+        try:
+            (pos, dest), duck = parseMove(board, text)
+        except ValueError as error:
+            raise GameRecordError(str(error), index, ply)
+        yield board
+        board.movePiece(pos, dest)
+        board.movePiece(board.duck_pos, duck)
+
+# Replays every game of one file. Writes the FEN before every ply to fen_path and/or their encoder.encode planes, as raw
+# uint8 (positions, len(encoder.PLANES), 8, 8) data, to planes_path. Bad games are skipped and reported.
+# Returns (games, positions, errors) with errors as strings
+def replayFile(path: str, fen_path: str = None, planes_path: str = None) -> tuple:
+    fen_file = openRecords(fen_path, "w") if fen_path else None
+    planes_file = open(planes_path, "wb") if planes_path else None
+    games, positions, errors, batch = 0, 0, [], []
+
+    def flush() -> None:
+        if batch:
+            planes_file.write(encoder.encode(batch).tobytes())
+            batch.clear()
+
+    # Games skipped while reading still count towards the index of the ones after them
+    skipped = []
+    try:
+        for game in readGames(path, skipped):
+            errors.extend(f"{path}: {error}" for error in skipped)
+            skipped.clear()
+            index = games + len(errors)
+            try:
+                fens = [board.getFEN() for board in replayGame(game, index)]
+            except GameRecordError as error:
+                errors.append(f"{path}: {error}")
+                continue
+            games += 1
+            positions += len(fens)
+            if fen_file:
+                fen_file.writelines(fen + "\n" for fen in fens)
+            if planes_file:
+                batch.extend(fens)
+                if len(batch) >= ENCODE_BATCH:
+                    flush()
+        errors.extend(f"{path}: {error}" for error in skipped)
+        if planes_file:
+            flush()
+    finally:
+        for file in (fen_file, planes_file):
+            if file:
+                file.close()
+    return games, positions, errors
+
+# Replays many game files, one per task, spread over a process pool. With fen_dir and/or planes_dir each file gets a
+# .fen and/or .planes file of the same name there. Returns the total (games, positions, errors)
+def replayFiles(paths: list, fen_dir: str = None, planes_dir: str = None, workers: int = None, output=sys.stdout) -> tuple:
+    tasks = []
+    for path in paths:
+        name = os.path.basename(path)
+        name = name[:-3] if name.endswith(".gz") else name
+        name = os.path.splitext(name)[0]
+        tasks.append((path, os.path.join(fen_dir, name + ".fen") if fen_dir else None, os.path.join(planes_dir, name + ".planes") if planes_dir else None))
+    for directory in (fen_dir, planes_dir):
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    start = time.perf_counter()
+    games, positions, errors = 0, 0, []
+
+    def report(result: tuple) -> None:
+        nonlocal games, positions
+        games += result[0]
+        positions += result[1]
+        errors.extend(result[2])
+        if output:
+            for error in result[2]:
+                print(error, file=output)
+            elapsed = time.perf_counter() - start
+            print(f"Games: {games}  Positions: {positions}  Errors: {len(errors)}  {positions / elapsed if elapsed > 0 else 0:.0f} positions/s", file=output)
+
+    for result in mapTasks(replayFile, tasks, workers, ordered=False):
+        report(result)
+    return games, positions, errors
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Replays game files, checking every move is legal and optionally writing out the positions")
+    parser.add_argument("files", nargs="+", help="Game files, .gz ones are read through gzip")
+    parser.add_argument("--fens", help="Directory to write the FEN before every ply to, one .fen file per game file")
+    parser.add_argument("--planes", help="Directory to write encoded positions to, one .planes file per game file")
+    parser.add_argument("--workers", type=int, default=0, help="Processes to replay files on, 0 for one per core")
+    args = parser.parse_args(argv)
+
+    _, _, errors = replayFiles(args.files, args.fens, args.planes, args.workers or None)
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
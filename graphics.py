@@ -1,34 +1,49 @@
+import functools, os
 import pygame
 import duck_chess
 
-# initialize pygame and create window
-pygame.init()
-pygame.mixer.init()  ## For sound
+# Sprites are found next to this file, so the renderer works from any working directory
+SPRITE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Sprites")
+SPRITE_NAMES = [f"{color} {type}" for color in ("White", "Black") for type in ("Pawn", "Knight", "Bishop", "Rook", "Queen", "King")] + ["Duck Duck"]
+
+# Loads and scales every sprite once per square size, keyed by piece name ("White Pawn", "Duck Duck", ...)
+@functools.lru_cache(maxsize=None)
+def loadSprites(width: int, height: int) -> dict:
+    return {name: pygame.transform.scale(pygame.image.load(os.path.join(SPRITE_DIR, f"{name}.png")), (width, height)) for name in SPRITE_NAMES}
 
 # Create sprite class for the various piece
 class PieceSprite(pygame.sprite.Sprite):
-    def __init__(self, type: str, height: int, width: int, pos: tuple) -> None:
+    def __init__(self, type: str, width: int, height: int, pos: tuple) -> None:
         super().__init__()
         
-        self.image = pygame.image.load(f"..\\Sprites\\{type}.png")
-        self.image = pygame.transform.scale(self.image, (width, height))
+        self.type = type
+        self.image = loadSprites(width, height)[type]
         self.rect = self.image.get_rect()
-        self.rect.x, self.rect.y = pos[0]*width, pos[1]*height
+        self.place(pos)
+    
+    # Moves the sprite onto the square at pos
+    def place(self, pos: tuple) -> None:
+        self.rect.x, self.rect.y = pos[0]*self.rect.width, pos[1]*self.rect.height
 
 class DCRenderer():
     # Initialize the renderer and all associated variables
-    def __init__(self, WIDTH: int, HEIGHT: int, TITLE: str, board: duck_chess.Board, FPS=30, colors: dict={}) -> None:
+    # With incremental, only the squares that changed since the last frame get repainted and pushed to the display.
+    # engine is an engine.EngineWorker that plays engine_color, thinking for engine_time seconds a move (or until M is
+    # pressed when it's None). With no engine_color it analyses every position instead, showing its line in the title
+    def __init__(self, WIDTH: int, HEIGHT: int, TITLE: str, board: duck_chess.Board, FPS=30, colors: dict={}, incremental: bool = False, engine=None, engine_color: str = None, engine_time: float = None) -> None:
         # initialize pygame and create window
         pygame.init()
         pygame.mixer.init()  # For sound
-        self.screen = pygame.display.set_mode((WIDTH, HEIGHT))
+        self.screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.RESIZABLE)
         self.width = int(WIDTH/8)
         self.height = int(HEIGHT/8)
         pygame.display.set_caption(TITLE)
+        self.title = TITLE
         self.clock = pygame.time.Clock()     # For syncing the FPS
 
         # group all the sprites together for ease of update
         self.pieces = pygame.sprite.Group()
+        self.sprite_at = {}
         
         # Set other variables
         self.fps = FPS
@@ -42,6 +57,21 @@ class DCRenderer():
         self.drawn_moves = []
         self.duck_turn = 0
         
+        # Incremental rendering state: the piece name each square was last painted with, the squares with move dots on
+        # them and the rects drawn since the last present
+        self.incremental = incremental
+        self.painted = [None] * 64
+        self.dots = set()
+        self.dirty = []
+        self.full_redraw = True
+        
+        # The FEN last handed to the engine and the search info last shown in the title
+        self.engine = engine
+        self.engine_color = engine_color
+        self.engine_time = engine_time
+        self.engine_fen = None
+        self.shown_info = None
+        
     # Process input/events
     def processInputs(self) -> None:
         self.clock.tick(self.fps) # will make the loop run at the same speed all the time
@@ -50,13 +80,20 @@ class DCRenderer():
             # listening for the the X button at the top
             if event.type == pygame.QUIT:
                 self.running = False
+            
+            elif event.type == pygame.VIDEORESIZE:
+                self.resize(event.w, event.h)
                 
             elif event.type == pygame.KEYDOWN and event.key == pygame.K_r:
                 self.board.setFEN("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1")
                 self.addPieces()
                 self.update(force=True)
+            
+            # Makes the engine play the best move it has found so far
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_m and self.engine != None:
+                self.engine.moveNow()
                 
-            elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1: 
+            elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and not self.isEngineTurn(): 
                 x,y = pygame.mouse.get_pos()
                 if self.duck_turn != 2:
                     clicked_piece = False
@@ -83,25 +120,113 @@ class DCRenderer():
                             break
                         self.duck_turn = 0
                         self.should_update = True
+        
+        self.pollEngine()
                     
+    # Returns whether it's the engine's side to move, so clicks are ignored
+    def isEngineTurn(self) -> bool:
+        return self.engine != None and self.engine_color == self.board.getTurn()
+    
+    # Hands new positions to the engine, shows the line it's thinking about and plays its move once it's done.
+    # The engine runs in its own process, so this only ever reads what it has sent and never waits on it
+    def pollEngine(self) -> None:
+        if self.engine == None:
+            return
+        # Positions are only searched between whole moves, not while the duck still has to be placed
+        fen = self.board.getFEN()
+        if self.duck_turn == 0 and fen != self.engine_fen:
+            self.engine_fen = fen
+            if self.board.getGameState() != None:
+                self.engine.cancel()
+            elif self.engine_color == None:
+                self.engine.start(fen)
+            elif self.isEngineTurn():
+                self.engine.start(fen, movetime=self.engine_time)
+            else:
+                self.engine.cancel()
+        
+        result = self.engine.poll()
+        if self.engine.info != self.shown_info:
+            self.shown_info = self.engine.info
+            if self.shown_info == None:
+                pygame.display.set_caption(self.title)
+            else:
+                line = " ".join(f"{self.board.getNotation(pos)}{self.board.getNotation(dest)}@{self.board.getNotation(duck)}" for (pos, dest), duck in self.shown_info.pv)
+                pygame.display.set_caption(f"{self.title}  depth {self.shown_info.depth}  score {self.shown_info.score}  {line}")
+        
+        if result != None and result.move != None and self.isEngineTurn():
+            (pos, dest), duck = result.move
+            self.board.movePiece(pos, dest)
+            self.board.movePiece(self.board.duck_pos, duck)
+            self.addPieces()
+            self.should_update = True
+    
+    # The window changed size, so the sprites are rebuilt at the new square size and everything is redrawn
+    def resize(self, width: int, height: int) -> None:
+        self.screen = pygame.display.get_surface()
+        self.width = int(width/8)
+        self.height = int(height/8)
+        self.pieces.empty()
+        self.addPieces()
+        self.full_redraw = True
+        self.should_update = True
+    
     # Tells the renderer when to update the pieces, so it doesn't draw when nothing changes
     def update(self, force:bool = False) -> None:
         if self.should_update or force:
-            self.draw("board", ["White", "Black"])
-            self.draw("pieces", [])
+            if self.incremental and not (force or self.full_redraw):
+                self.drawChanged()
+            else:
+                self.draw("board", ["White", "Black"])
+                self.draw("pieces", [])
+                self.painted = [self.sprite_at[(sq % 8, sq // 8)].type if (sq % 8, sq // 8) in self.sprite_at else None for sq in range(64)]
+                self.dots = set()
+                self.dirty = [self.screen.get_rect()]
+                self.full_redraw = False
             self.drawn_moves = []
             
             if self.duck_turn == 1:
                 self.duck_turn += 1
                 self.drawMoves(self.pieces.sprites()[self.duck_sprite_index])
             
-            if self.board.getGameState() == "win":
+            state = self.board.getGameState()
+            if state == "win":
                 self.board.turn = not self.board.turn
                 print(self.board.getTurn() + " Win")
                 self.running = False
+            elif state == "draw":
+                print(f"Draw by {self.board.getDrawReason()}")
+                self.running = False
                 
             self.should_update = False
     
+    # Repaints only the squares whose piece changed since they were last painted, and clears the old move dots
+    def drawChanged(self) -> None:
+        for sq in range(64):
+            pos = (sq % 8, sq // 8)
+            sprite = self.sprite_at.get(pos)
+            if (sprite.type if sprite else None) != self.painted[sq] or pos in self.dots:
+                self.drawSquare(pos)
+        self.dots = set()
+    
+    # Paints one square, its background and then the piece standing on it
+    def drawSquare(self, pos: tuple) -> None:
+        rect = pygame.Rect(pos[0]*self.width, pos[1]*self.height, self.width, self.height)
+        self.screen.fill(self.colors[["White", "Black"][(pos[0] + pos[1]) % 2]], rect)
+        sprite = self.sprite_at.get(pos)
+        if sprite:
+            self.screen.blit(sprite.image, sprite.rect)
+        self.painted[pos[1]*8 + pos[0]] = sprite.type if sprite else None
+        self.dirty.append(rect)
+    
+    # Pushes what was drawn to the display, only the changed rects in incremental mode
+    def present(self) -> None:
+        if not self.incremental:
+            pygame.display.flip()
+        elif self.dirty:
+            pygame.display.update(self.dirty)
+        self.dirty = []
+    
     # Draw various things
     def draw(self, function, color: list) -> None:
         # Fill the whole screen
@@ -128,26 +253,39 @@ class DCRenderer():
         self.drawn_moves.append(piece.rect)
         
         # # Draw attacked Squares
-        # for space in self.board.attacked_squares:
+        # for space in self.board.getAttackedSquares():
         #     pygame.draw.circle(self.screen, (222, 84, 84), ((space[0]*self.width) + (self.width/2), (space[1]*self.height) + (self.height/2)), self.width / 3.5)
         
         # Draw the available moves
         for space in self.board.getAvailableMoves((int(piece.rect.x/self.width), int(piece.rect.y/self.height))):
             pygame.draw.circle(self.screen, (84, 222, 139), ((space[0]*self.width) + (self.width/2), (space[1]*self.height) + (self.height/2)), self.width / 4)
             self.drawn_moves.append(pygame.Rect(space[0]*self.width, space[1]*self.height, self.width, self.height))
+            self.dots.add(space)
+            self.dirty.append(self.drawn_moves[-1])
         
         
     # Returns whether the process is still running
     def isRunning(self) -> bool:
         return self.running
     
-    # Translates the current board into sprites
+    # Translates the current board into sprites, reusing the sprites already made for pieces of the same name
     def addPieces(self) -> None:
-        self.pieces.remove(self.pieces)
+        spare = {}
+        for sprite in self.pieces.sprites():
+            spare.setdefault(sprite.type, []).append(sprite)
+        self.pieces.empty()
+        self.sprite_at = {}
         for row_index, row in enumerate(self.board.getBoard()):
             for column_index, piece in enumerate(row):
                 if piece.getType() != None:
                     if piece.getType() == "Duck":
                         self.duck_sprite_index = self.pieces.__len__()
-                    self.pieces.add(PieceSprite(str(piece), self.width, self.height, (column_index, row_index)))
+                    sprites = spare.get(str(piece))
+                    if sprites:
+                        sprite = sprites.pop()
+                        sprite.place((column_index, row_index))
+                    else:
+                        sprite = PieceSprite(str(piece), self.width, self.height, (column_index, row_index))
+                    self.pieces.add(sprite)
+                    self.sprite_at[(column_index, row_index)] = sprite
     
\ No newline at end of file
@@ -0,0 +1,147 @@
+import contextlib, functools, json, time
+import duck_chess, bitboard
+
+# Opt-in call counts and timings for the board's hot paths. Nothing is touched until enable() wraps the methods below
+# on the board classes, and disable() puts the originals back, so a run that doesn't ask for it pays nothing
+FUNCTIONS = [
+    "iterPieceMoves", "getAvailableMoves", "moveMask", "getAllMoves", "generateMoves", "getEmptySquares",
+    "movePiece", "makeMove", "unmakeMove", "changeSquares",
+    "addAttacks", "removeAttacks", "setAttackedSquares", "attacksBy", "findSliders",
+    "getGameState", "isKingTaken", "hasPieceMoves", "findPiece", "setFEN", "getFEN",
+]
+# Methods that return iterators, which are timed over every step instead of just the call that makes them
+GENERATORS = {"iterPieceMoves", "generateMoves"}
+# Methods that rebuild part of an attack map
+ATTACK_FUNCTIONS = {"addAttacks", "setAttackedSquares", "attacksBy"}
+# Methods whose results are counted as generated moves, by the type of the piece moving. They take the piece's (x, y)
+# position, or for BitBoard.moveMask its y * 8 + x square (None for the off board duck) and return a bitmask
+PIECE_FUNCTIONS = {"iterPieceMoves", "getAvailableMoves", "moveMask"}
+CLASSES = [duck_chess.Board, bitboard.BitBoard]
+
+# The originals of every method enable() replaced, as (class, name, function)
+_wrapped = []
+
+
+class Profile():
+    # What the instrumented methods did while enabled. Times are cumulative, so a method's time includes the methods it calls
+    def __init__(self) -> None:
+        self.calls = {}
+        self.times = {}
+        # Moves generated for each piece type, and the squares attacked for each when attack maps are built
+        self.piece_nodes = {}
+        self.piece_attacks = {}
+        # How deep in move generation the current call is, so moves are only counted by the outermost method
+        self.piece_depth = 0
+
+    def record(self, name: str, elapsed: float) -> None:
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.times[name] = self.times.get(name, 0.0) + elapsed
+
+    def countPieces(self, board, args: tuple, kwargs: dict, count: int) -> None:
+        pos = args[0]
+        if type(pos) != tuple:
+            pos = (0, 8) if pos == None else (pos % 8, pos // 8)
+        piece_type = board.getPiece(pos).getType()
+        counts = self.piece_attacks if (args[1] if len(args) > 1 else kwargs.get("attacking", False)) else self.piece_nodes
+        counts[piece_type] = counts.get(piece_type, 0) + count
+
+    def getAttackRecomputes(self) -> int:
+        return sum(self.calls.get(name, 0) for name in ATTACK_FUNCTIONS)
+
+    def toDict(self) -> dict:
+        return {
+            "functions": {name: {"calls": self.calls[name], "time": self.times[name]} for name in sorted(self.calls, key=self.times.get, reverse=True)},
+            "piece_nodes": dict(self.piece_nodes),
+            "piece_attacks": dict(self.piece_attacks),
+            "attack_recomputes": self.getAttackRecomputes(),
+        }
+
+    def toJSON(self) -> str:
+        return json.dumps(self.toDict(), indent=2)
+
+    # Formats everything recorded as a plain text table, slowest functions first
+    def report(self) -> str:
+        lines = [f"{'Function':<20}{'Calls':>12}{'Time (s)':>12}{'Per call (us)':>16}"]
+        for name, stats in self.toDict()["functions"].items():
+            lines.append(f"{name:<20}{stats['calls']:>12}{stats['time']:>12.3f}{stats['time'] / stats['calls'] * 1e6:>16.2f}")
+        for title, counts in (("Moves", self.piece_nodes), ("Attacks", self.piece_attacks)):
+            if counts:
+                lines.append(f"{title} by piece: " + "  ".join(f"{piece_type}: {count}" for piece_type, count in sorted(counts.items(), key=lambda item: -item[1])))
+        lines.append(f"Attack map recomputes: {self.getAttackRecomputes()}")
+        return "\n".join(lines)
+
+def _wrapFunction(profile: Profile, name: str, function):
+    pieces = name in PIECE_FUNCTIONS
+
+    @functools.wraps(function)
+    def wrapper(self, *args, **kwargs):
+        profile.piece_depth += pieces
+        start = time.perf_counter()
+        try:
+            result = function(self, *args, **kwargs)
+        finally:
+            profile.record(name, time.perf_counter() - start)
+            profile.piece_depth -= pieces
+        if pieces and profile.piece_depth == 0:
+            profile.countPieces(self, args, kwargs, bin(result).count("1") if type(result) == int else len(result))
+        return result
+    return wrapper
+
+def _wrapGenerator(profile: Profile, name: str, function):
+    pieces = name in PIECE_FUNCTIONS
+
+    @functools.wraps(function)
+    def wrapper(self, *args, **kwargs):
+        outermost = profile.piece_depth == 0
+        profile.piece_depth += pieces
+        start = time.perf_counter()
+        try:
+            iterator = iter(function(self, *args, **kwargs))
+        finally:
+            profile.record(name, time.perf_counter() - start)
+            profile.piece_depth -= pieces
+        count = 0
+        while True:
+            profile.piece_depth += pieces
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                profile.times[name] += time.perf_counter() - start
+                profile.piece_depth -= pieces
+            count += 1
+            yield item
+        if pieces and outermost:
+            profile.countPieces(self, args, kwargs, count)
+    return wrapper
+
+# Starts recording into a new Profile, which is returned. Methods inherited from another instrumented class are only
+# wrapped once, on the class that defines them
+def enable(classes: list = None) -> Profile:
+    disable()
+    profile = Profile()
+    for cls in classes or CLASSES:
+        for name in FUNCTIONS:
+            if name in cls.__dict__:
+                function = cls.__dict__[name]
+                wrap = _wrapGenerator if name in GENERATORS else _wrapFunction
+                _wrapped.append((cls, name, function))
+                setattr(cls, name, wrap(profile, name, function))
+    return profile
+
+# Puts every wrapped method back
+def disable() -> None:
+    while _wrapped:
+        cls, name, function = _wrapped.pop()
+        setattr(cls, name, function)
+
+# Records everything done inside a with block, yielding the Profile
+@contextlib.contextmanager
+def profiled(classes: list = None):
+    profile = enable(classes)
+    try:
+        yield profile
+    finally:
+        disable()
@@ -0,0 +1,340 @@
+import math, time
+from collections import namedtuple
+import numpy as np
+import duck_chess
+from search import evaluate
+
+# Monte Carlo tree search over Board. A turn takes two tree levels, the piece move and then the duck square, so a
+# position has one child per piece move rather than one per piece move and duck square. Values are in [-1, 1] and a
+# node's value is from the point of view of the side that chose it.
+#
+# Evaluators take a list of Boards, each at the start of a turn, and return (piece priors, duck priors, values):
+#   piece priors  (N, 64, 64) indexed [from, to] with squares as y * 8 + x, like encoder.legalMasks
+#   duck priors   (N, 64), used for the duck square after whichever piece move is played
+#   values        (N,) from the side to move's point of view
+# Priors don't have to be normalized or masked, only the legal moves' entries are looked at
+POSITION, DUCK = 0, 1
+# Node states. Pending nodes are waiting in the current batch for their evaluation
+NEW, PENDING, EXPANDED, TERMINAL = range(4)
+# The arrays every node has an entry in, with their types
+NODE_FIELDS = {
+    # Node number of the parent, -1 for the root
+    "parent": np.int32,
+    # For duck level nodes the piece move into them as from * 64 + to, for position nodes the duck square
+    "move": np.int16,
+    "level": np.int8,
+    "state": np.int8,
+    # Children are stored next to each other, first is the node number of the first one
+    "first": np.int32,
+    "count": np.int32,
+    "visits": np.int32,
+    # Searches currently passing through the node, each counted as a loss until it comes back
+    "virtual": np.int32,
+    "value": np.float64,
+    "prior": np.float32,
+    # For terminal positions, the result for the side to move
+    "result": np.float32,
+    # Row of the duck prior store for evaluated position nodes
+    "duck_row": np.int32,
+}
+
+# move is a compound move, ((pos, dest), duck_dest), and value is its expected result for the side to move
+MCTSResult = namedtuple("MCTSResult", ["move", "value", "visits", "evaluations", "time", "pv"])
+
+
+# Uniform priors and search.evaluate squashed into (-1, 1), for playing without a model
+def materialEvaluator(boards: list) -> tuple:
+    count = len(boards)
+    values = np.array([math.tanh(evaluate(board) / 400) for board in boards], dtype=np.float32)
+    return np.ones((count, 64, 64), dtype=np.float32), np.ones((count, 64), dtype=np.float32), values
+
+# Returns a Board in the same position that can be changed without touching the original
+def copyBoard(board: duck_chess.Board) -> duck_chess.Board:
+    copy = type(board).__new__(type(board))
+    copy.setPosition(board.getPosition())
+    copy.repetitions = dict(board.repetitions)
+    return copy
+
+def toPos(sq: int) -> tuple:
+    return (int(sq) % 8, int(sq) // 8)
+
+class NodeTree():
+    # Every node field in its own flat array, grown by doubling, rather than one Python object per node
+    def __init__(self, capacity: int = 4096) -> None:
+        self.size = 0
+        for name, dtype in NODE_FIELDS.items():
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+        self.duck_rows = 0
+        self.duck_priors = np.zeros((max(1, capacity // 16), 64), dtype=np.float32)
+
+    # Adds count nodes with default fields and returns the first one's number
+    def allocate(self, count: int) -> int:
+        first = self.size
+        if first + count > len(self.parent):
+            capacity = max(len(self.parent) * 2, first + count)
+            for name in NODE_FIELDS:
+                grown = np.zeros(capacity, dtype=NODE_FIELDS[name])
+                grown[:first] = getattr(self, name)[:first]
+                setattr(self, name, grown)
+        self.size += count
+        nodes = slice(first, first + count)
+        for name in NODE_FIELDS:
+            getattr(self, name)[nodes] = 0
+        self.parent[nodes] = -1
+        self.duck_row[nodes] = -1
+        return first
+
+    # Stores a position's duck priors, returning their row
+    def addDuckPriors(self, priors: np.ndarray) -> int:
+        if self.duck_rows == len(self.duck_priors):
+            self.duck_priors = np.concatenate([self.duck_priors, np.zeros_like(self.duck_priors)])
+        self.duck_priors[self.duck_rows] = priors
+        self.duck_rows += 1
+        return self.duck_rows - 1
+
+    # Adds the children of a node, one per move, with their priors normalized over the legal moves
+    def expand(self, node: int, moves: list, priors: np.ndarray) -> None:
+        total = priors.sum()
+        priors = priors / total if total > 0 else np.full(len(moves), 1 / len(moves))
+        first = self.allocate(len(moves))
+        children = slice(first, first + len(moves))
+        self.parent[children] = node
+        self.move[children] = moves
+        self.level[children] = 1 - self.level[node]
+        self.prior[children] = priors
+        self.first[node] = first
+        self.count[node] = len(moves)
+        self.state[node] = EXPANDED
+
+    # Returns the child of a node played with a move, or None
+    def findChild(self, node: int, move: int) -> int:
+        first = self.first[node]
+        found = np.flatnonzero(self.move[first:first + self.count[node]] == move)
+        return first + int(found[0]) if len(found) else None
+
+    # Returns the most visited child of a node, or None if it has none
+    def bestChild(self, node: int) -> int:
+        if self.count[node] == 0:
+            return None
+        first = self.first[node]
+        return first + int(np.argmax(self.visits[first:first + self.count[node]]))
+
+    # Copies the subtree under node into a new tree, where it becomes node 0
+    def subtree(self, node: int) -> "NodeTree":
+        tree = NodeTree(max(4096, self.size))
+        tree.allocate(1)
+        pairs = [(node, 0)]
+        self.copyNodes(tree, node, 0, 1)
+        tree.parent[0] = -1
+        while pairs:
+            old, new = pairs.pop()
+            if self.duck_row[old] >= 0:
+                tree.duck_row[new] = tree.addDuckPriors(self.duck_priors[self.duck_row[old]])
+            count = self.count[old]
+            if count == 0:
+                continue
+            first = tree.allocate(count)
+            self.copyNodes(tree, self.first[old], first, count)
+            tree.parent[first:first + count] = new
+            tree.first[new] = first
+            pairs.extend(zip(range(self.first[old], self.first[old] + count), range(first, first + count)))
+        return tree
+
+    def copyNodes(self, tree: "NodeTree", start: int, destination: int, count: int) -> None:
+        for name in NODE_FIELDS:
+            getattr(tree, name)[destination:destination + count] = getattr(self, name)[start:start + count]
+        tree.duck_row[destination:destination + count] = -1
+
+class MCTS():
+    # Searches from a copy of board. Leaves are gathered batch_size at a time and sent to evaluator in one call, with
+    # virtual_loss counted against every node a gathered search passes through so the rest of the batch looks elsewhere.
+    # c_puct weighs priors against values when picking children
+    def __init__(self, board: duck_chess.Board, evaluator=materialEvaluator, batch_size: int = 16, c_puct: float = 1.5, virtual_loss: float = 1.0) -> None:
+        self.board = copyBoard(board)
+        self.evaluator = evaluator
+        self.batch_size = batch_size
+        self.c_puct = c_puct
+        self.virtual_loss = virtual_loss
+        self.tree = NodeTree()
+        self.tree.allocate(1)
+        self.evaluations = 0
+        # Searches that ran into a leaf already waiting in the same batch
+        self.collisions = 0
+
+    # Runs batches until simulations, movetime (seconds) or stop (anything with an is_set method) runs out. callback
+    # is called with an MCTSResult after every batch. Returns None if the game is already over
+    def search(self, simulations: int = None, movetime: float = None, callback=None, stop=None) -> MCTSResult:
+        if simulations == None and movetime == None and stop == None:
+            raise ValueError("MCTS needs a simulation count, movetime or stop event")
+        start = time.perf_counter()
+        done = 0
+        while simulations == None or done < simulations:
+            if (movetime != None and time.perf_counter() - start >= movetime) or (stop != None and stop.is_set()):
+                break
+            gathered = self.runBatch(self.batch_size if simulations == None else min(self.batch_size, simulations - done))
+            if gathered == 0:
+                break
+            done += gathered
+            if callback != None:
+                callback(self.getResult(time.perf_counter() - start))
+        return self.getResult(time.perf_counter() - start)
+
+    # Gathers up to count leaves, evaluates them together and backs their values up. Returns how many searches finished
+    def runBatch(self, count: int) -> int:
+        tree = self.tree
+        if tree.state[0] == TERMINAL:
+            return 0
+        leaves, finished, collisions = [], 0, 0
+        while len(leaves) + finished < count and collisions < count:
+            leaf = self.gather()
+            if leaf == None:
+                collisions += 1
+            elif leaf[0] == None:
+                finished += 1
+            else:
+                leaves.append(leaf)
+        self.collisions += collisions
+        if leaves:
+            piece_priors, duck_priors, values = self.evaluator([board for _, _, board, _ in leaves])
+            self.evaluations += len(leaves)
+            for index, (path, turns, board, moves) in enumerate(leaves):
+                node = path[-1]
+                squares = np.array([(pos[1] * 8 + pos[0]) * 64 + dest[1] * 8 + dest[0] for pos, dest in moves])
+                tree.expand(node, squares, np.asarray(piece_priors[index], dtype=np.float32).reshape(-1)[squares])
+                tree.duck_row[node] = tree.addDuckPriors(duck_priors[index])
+                self.backup(path, turns, float(values[index]), board.turn)
+        return len(leaves) + finished
+
+    # Walks down from the root to a leaf, adding virtual loss on the way. Terminal leaves are backed up straight away and
+    # give (None,), leaves already pending give None, and new leaves give (path, turns, board, moves) where turns[i]
+    # is the side that chose path[i]
+    def gather(self) -> tuple:
+        tree, board = self.tree, self.board
+        node, path, turns = 0, [0], [None]
+        tree.virtual[0] += 1
+        result = None
+        while True:
+            state = tree.state[node]
+            if tree.level[node] == POSITION and state != EXPANDED:
+                if state == TERMINAL:
+                    self.backup(path, turns, float(tree.result[node]), board.turn)
+                    result = (None,)
+                elif state == PENDING:
+                    self.removeVirtual(path)
+                else:
+                    result = self.checkLeaf(path, turns)
+                break
+            if state == NEW:
+                self.expandDuck(node)
+            turns.append(board.turn)
+            node = self.pickChild(node)
+            move = int(tree.move[node])
+            if tree.level[node] == DUCK:
+                board.makeMove((toPos(move // 64), toPos(move % 64)))
+            else:
+                board.makeMove((board.duck_pos, toPos(move)))
+            path.append(node)
+            tree.virtual[node] += 1
+        for _ in path[1:]:
+            board.unmakeMove()
+        return result
+
+    # Handles a new position leaf: game over positions become terminal and are backed up, the rest are marked pending
+    # and returned for evaluation
+    def checkLeaf(self, path: list, turns: list) -> tuple:
+        tree, board, node = self.tree, self.board, path[-1]
+        moves = None
+        if board.isKingTaken():
+            value = -1.0
+        elif board.isDrawByRule():
+            value = 0.0
+        else:
+            moves = list(board.generateMoves(piece_moves_only=True))
+            # Not being able to move a piece is a draw
+            value = 0.0
+        if not moves:
+            tree.state[node] = TERMINAL
+            tree.result[node] = value
+            self.backup(path, turns, value, board.turn)
+            return (None,)
+        tree.state[node] = PENDING
+        return (path, turns, copyBoard(board), moves)
+
+    # Adds the duck squares of a node after a piece move, using the duck priors of the position before it
+    def expandDuck(self, node: int) -> None:
+        tree = self.tree
+        squares = np.array([y * 8 + x for x, y in self.board.getEmptySquares()])
+        tree.expand(node, squares, tree.duck_priors[tree.duck_row[tree.parent[node]]][squares])
+
+    # The child with the best PUCT score, searches in flight counted as losses. Unvisited children score 0 plus their prior
+    def pickChild(self, node: int) -> int:
+        tree = self.tree
+        first, count = tree.first[node], tree.count[node]
+        children = slice(first, first + count)
+        virtual = tree.virtual[children]
+        visits = tree.visits[children] + virtual
+        values = np.where(visits > 0, (tree.value[children] - virtual * self.virtual_loss) / np.maximum(visits, 1), 0)
+        explore = self.c_puct * math.sqrt(tree.visits[node] + tree.virtual[node]) * tree.prior[children] / (1 + visits)
+        return first + int(np.argmax(values + explore))
+
+    # Adds a value, from the point of view of the side to move at the leaf (turn), to every node on the path and takes
+    # the path's virtual loss back off
+    def backup(self, path: list, turns: list, value: float, turn: bool) -> None:
+        tree = self.tree
+        for node, chooser in zip(path, turns):
+            tree.visits[node] += 1
+            tree.virtual[node] -= 1
+            if chooser != None:
+                tree.value[node] += value if chooser == turn else -value
+
+    def removeVirtual(self, path: list) -> None:
+        for node in path:
+            self.tree.virtual[node] -= 1
+
+    # Returns the most visited compound move, its value and the line of most visited moves after it
+    def getResult(self, elapsed: float) -> MCTSResult:
+        tree, node = self.tree, 0
+        pv, value = [], 0.0
+        while True:
+            piece = tree.bestChild(node)
+            if piece == None:
+                break
+            duck = tree.bestChild(piece)
+            if duck == None or tree.visits[duck] == 0:
+                break
+            move = int(tree.move[piece])
+            pv.append(((toPos(move // 64), toPos(move % 64)), toPos(tree.move[duck])))
+            if node == 0:
+                value = float(tree.value[piece] / max(tree.visits[piece], 1))
+            node = duck
+        return MCTSResult(pv[0] if pv else None, value, int(tree.visits[0]), self.evaluations, elapsed, pv)
+
+    # Returns the root's visit counts, piece moves as a (64, 64) [from, to] array and duck squares after the most
+    # visited piece move as (64,), for training a model on
+    def getVisits(self) -> tuple:
+        tree = self.tree
+        pieces, ducks = np.zeros(64 * 64, dtype=np.int32), np.zeros(64, dtype=np.int32)
+        first, count = tree.first[0], tree.count[0]
+        pieces[tree.move[first:first + count]] = tree.visits[first:first + count]
+        best = tree.bestChild(0)
+        if best != None and tree.count[best]:
+            first, count = tree.first[best], tree.count[best]
+            ducks[tree.move[first:first + count]] = tree.visits[first:first + count]
+        return pieces.reshape(64, 64), ducks
+
+    # Plays a compound move, keeping the subtree under it as the new tree
+    def advance(self, move: tuple) -> None:
+        (pos, dest), duck = move
+        tree = self.tree
+        child = tree.findChild(0, (pos[1] * 8 + pos[0]) * 64 + dest[1] * 8 + dest[0]) if tree.count[0] else None
+        if child != None and tree.count[child]:
+            child = tree.findChild(child, duck[1] * 8 + duck[0])
+        else:
+            child = None
+        self.board.makeMove((pos, dest))
+        self.board.makeMove((self.board.duck_pos, duck))
+        if child == None:
+            self.tree = NodeTree()
+            self.tree.allocate(1)
+        else:
+            self.tree = tree.subtree(child)
@@ -0,0 +1,120 @@
+import functools, os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import duck_chess
+from search import Search, INFINITY, MATE, orderPieceMoves, orderDuckMoves
+
+# The root position each worker process rebuilds once, in _initWorker
+_root_board = None
+# The Searches each worker keeps between root moves, by (hash_mb, duck_width), so their transposition tables carry over
+_searchers = {}
+# Work whose pieces vary a lot in size is cut into this many chunks per worker, so the pool can hand the next chunk to
+# whichever worker frees up first
+CHUNKS_PER_WORKER = 16
+
+
+# Yields function(*task) for every task, run on a pool of workers processes (one per core by default) or right here
+# with one worker. Results come in task order, or as they finish with ordered off. initializer(*initargs) sets up each
+# process, as with ProcessPoolExecutor. function has to be importable at module level
+def mapTasks(function, tasks, workers: int = None, ordered: bool = True, initializer=None, initargs: tuple = ()):
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        if initializer != None:
+            initializer(*initargs)
+        for task in tasks:
+            yield function(*task)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as executor:
+        futures = [executor.submit(function, *task) for task in tasks]
+        for future in futures if ordered else as_completed(futures):
+            yield future.result()
+
+# How many items go in a chunk when count of them are split CHUNKS_PER_WORKER ways per worker
+def chunkSize(count: int, workers: int = None) -> int:
+    return max(1, count // ((workers or os.cpu_count() or 1) * CHUNKS_PER_WORKER))
+
+
+# Returns every compound root move as ((pos, dest), duck_dest): a piece move and where the duck goes after it
+def rootMoves(board: duck_chess.Board) -> list:
+    return list(board.generateMoves(stable=True))
+
+def _initWorker(backend: type, fen: str) -> None:
+    global _root_board
+    _root_board = backend(fen)
+
+# Plays each root move in a chunk on the worker's board, and returns what function gives for the position after it
+def _runChunk(function, depth: int, chunk: list) -> list:
+    board = _root_board
+    results = []
+    for move, duck_dest in chunk:
+        board.makeMove(move)
+        board.makeMove((board.duck_pos, duck_dest))
+        results.append(function(board, depth))
+        board.unmakeMove()
+        board.unmakeMove()
+    return results
+
+# The compound root moves a Search tries: every piece move, each with its duck_width best looking duck squares
+def searchMoves(board: duck_chess.Board, duck_width: int) -> list:
+    moves = []
+    for move in orderPieceMoves(board):
+        board.makeMove(move)
+        moves.extend((move, duck) for duck in orderDuckMoves(board, duck_width))
+        board.unmakeMove()
+    return moves
+
+# Searches the position after a root move depth plies deep, returning its score for the side that made the move.
+# Scores are worked out one ply from the root so mate distances match a Search of the whole tree. A score at or below
+# alpha only means the move is no better than alpha
+def searchRootMove(board: duck_chess.Board, depth: int, alpha: int = -INFINITY, hash_mb: float = 16, duck_width: int = 6) -> int:
+    search = _getSearcher(board, hash_mb, duck_width)
+    return -search.negamax(depth, -INFINITY, -alpha, 1)
+
+def _getSearcher(board: duck_chess.Board, hash_mb: float, duck_width: int) -> Search:
+    search = _searchers.get((hash_mb, duck_width))
+    if search == None:
+        search = _searchers[(hash_mb, duck_width)] = Search(board, hash_mb, duck_width)
+    search.board = board
+    search.nodes = 0
+    return search
+
+# Searches fen depth plies deep with the root moves spread over a process pool, and returns (score, best compound move)
+# like Search.searchRoot, or (0, None) when there are no moves and (-MATE, None) when the king is already gone. Ties go
+# to the move searched first.
+# A search one ply shallower picks the move to try first, that move is searched here, and its score is the bound the
+# rest are searched against, so they get the cutoffs a Search's root gets from its iterative deepening
+def searchRoot(fen: str, depth: int, backend: type = duck_chess.Board, workers: int = None, hash_mb: float = 16, duck_width: int = 6) -> tuple:
+    board = backend(fen)
+    if board.isKingTaken():
+        return -MATE, None
+    moves = searchMoves(board, duck_width)
+    if not moves:
+        return 0, None
+    if depth > 1:
+        first = _getSearcher(board, hash_mb, duck_width).search(depth=depth - 1).move
+        if first in moves:
+            moves.remove(first)
+            moves.insert(0, first)
+    (move, duck_dest) = moves[0]
+    board.makeMove(move)
+    board.makeMove((board.duck_pos, duck_dest))
+    scores = {moves[0]: searchRootMove(board, depth - 1, hash_mb=hash_mb, duck_width=duck_width)}
+    if len(moves) > 1:
+        function = functools.partial(searchRootMove, alpha=scores[moves[0]], hash_mb=hash_mb, duck_width=duck_width)
+        scores.update(mapRootMoves(fen, function, depth - 1, backend, workers, moves=moves[1:]))
+    best_move = max(moves, key=lambda move: scores[move])
+    return scores[best_move], best_move
+
+# Calls function(board, depth) on the position after every root move of fen, or just the given moves, spread over a
+# process pool. Workers only get the FEN and their moves, and the results come back keyed by move in root move order,
+# so the output is the same for any number of workers. function has to be importable at module level
+def mapRootMoves(fen: str, function, depth: int, backend: type = duck_chess.Board, workers: int = None, chunk_size: int = None, moves: list = None) -> dict:
+    if moves == None:
+        moves = rootMoves(backend(fen))
+    # Subtrees vary a lot in size once the duck blocks lines, so the moves go out in small chunks
+    if chunk_size == None:
+        chunk_size = chunkSize(len(moves), workers)
+    chunks = [moves[i:i + chunk_size] for i in range(0, len(moves), chunk_size)]
+    results = {}
+    for chunk, chunk_results in zip(chunks, mapTasks(_runChunk, [(function, depth, chunk) for chunk in chunks], workers, initializer=_initWorker, initargs=(backend, fen))):
+        results.update(zip(chunk, chunk_results))
+    return results
@@ -0,0 +1,147 @@
+import argparse, json, sys, time
+import duck_chess, bitboard, instrument, parallel
+from transposition import TranspositionTable
+
+# Expected node counts, by FEN and depth. There is no outside reference for these rules,
+# so these come from this generator and pin its behaviour down against regressions.
+# One ply is a piece move followed by a duck placement, so depth 1 counts every (move, duck square) pair
+REFERENCE = {
+    duck_chess.DEFAULT_FEN: {1: 640, 2: 379440},
+    "r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4": {1: 1026, 2: 884845},
+    "rnbqkbnr/ppp1pppp/8/3pP3/8/3D4/PPPP1PPP/RNBQKBNR w KQkq d6 0 3": {1: 776, 2: 612904},
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1": {1: 811, 2: 676645},
+    "4k3/8/3D4/8/8/8/8/R3K3 b - - 0 1": {1: 300, 2: 258300, 3: 96515220},
+}
+
+BACKENDS = {"board": duck_chess.Board, "bitboard": bitboard.BitBoard}
+
+
+# Counts the leaf nodes depth plies below the current position
+def perft(board: duck_chess.Board, depth: int, table: TranspositionTable = None) -> int:
+    if depth == 0:
+        return 1
+    # A missing king ends the game, so there is nothing below it
+    if board.isKingTaken():
+        return 0
+    if table != None and depth > 1:
+        entry = table.probe(board.getKey())
+        if entry != None and entry[0] == depth:
+            return entry[1]
+
+    nodes = 0
+    for pos, moves in board.getAllMoves(board.getTurn()).items():
+        for dest in moves:
+            board.makeMove((pos, dest))
+            nodes += perftDuck(board, depth, table)
+            board.unmakeMove()
+
+    if table != None and depth > 1:
+        table.store(board.getKey(), depth, nodes)
+    return nodes
+
+# Counts the leaves below a piece move, over every square the duck can be placed on
+def perftDuck(board: duck_chess.Board, depth: int, table: TranspositionTable = None) -> int:
+    duck = board.duck_pos
+    duck_moves = board.getAvailableMoves(duck)
+    # Every placement finishes a ply, so at the last ply they only need counting
+    if depth == 1:
+        return len(duck_moves)
+    nodes = 0
+    for dest in duck_moves:
+        board.makeMove((duck, dest))
+        nodes += perft(board, depth - 1, table)
+        board.unmakeMove()
+    return nodes
+
+# Returns the node count under each root piece move, summed over its duck placements
+def divide(board: duck_chess.Board, depth: int, table: TranspositionTable = None) -> dict:
+    counts = {}
+    for pos, moves in board.getAllMoves(board.getTurn()).items():
+        for dest in moves:
+            board.makeMove((pos, dest))
+            counts[board.getNotation(pos) + board.getNotation(dest)] = perftDuck(board, depth, table)
+            board.unmakeMove()
+    return counts
+
+# Runs perft with the root moves split over a process pool, returning the same dict as divide
+def parallelDivide(fen: str, depth: int, backend: str = "board", workers: int = None) -> dict:
+    counts = {}
+    board = BACKENDS[backend](fen)
+    for (move, _), nodes in parallel.mapRootMoves(fen, perft, depth - 1, BACKENDS[backend], workers).items():
+        name = board.getNotation(move[0]) + board.getNotation(move[1])
+        counts[name] = counts.get(name, 0) + nodes
+    return counts
+
+# Runs perft on every position at every depth, returning one result dict per run. With profile each run also gets an
+# instrument.Profile breakdown, which only sees this process so the run isn't split over workers
+def runSuite(positions: list, depths: list, backend: str = "board", show_divide: bool = False, hash_mb: float = 0, workers: int = 1, profile: bool = False, output=sys.stdout) -> list:
+    results = []
+    for fen in positions:
+        board = BACKENDS[backend](fen)
+        if output:
+            print(fen, file=output)
+        for depth in depths:
+            table = TranspositionTable(hash_mb) if hash_mb else None
+            recorder = instrument.enable() if profile else None
+            start = time.perf_counter()
+            if workers != 1 and depth > 1 and not profile:
+                counts = parallelDivide(fen, depth, backend, workers)
+                nodes = sum(counts.values())
+            elif show_divide:
+                counts = divide(board, depth, table)
+                nodes = sum(counts.values())
+            else:
+                counts = None
+                nodes = perft(board, depth, table)
+            elapsed = time.perf_counter() - start
+            if profile:
+                instrument.disable()
+
+            expected = REFERENCE.get(fen, {}).get(depth)
+            result = {
+                "fen": fen,
+                "depth": depth,
+                "nodes": nodes,
+                "time": elapsed,
+                "nps": nodes / elapsed if elapsed > 0 else 0.0,
+                "expected": expected,
+                "passed": None if expected == None else nodes == expected,
+                "divide": counts if show_divide else None,
+                "profile": recorder.toDict() if profile else None,
+            }
+            results.append(result)
+
+            if output:
+                if show_divide and counts:
+                    for move, count in counts.items():
+                        print(f"    {move}: {count}", file=output)
+                status = {None: "", True: "  OK", False: f"  FAILED (expected {expected})"}[result["passed"]]
+                print(f"  Depth {depth}: {nodes} nodes  {elapsed:.3f}s  {result['nps']:.0f} nps{status}", file=output)
+                if profile:
+                    print("\n".join("    " + line for line in recorder.report().splitlines()), file=output)
+    return results
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Counts duck chess move generation nodes and times it")
+    parser.add_argument("--fen", action="append", help="Position to search, can be given more than once. Defaults to every reference position")
+    parser.add_argument("--depth", type=int, nargs="+", default=[1, 2], help="Depths to search to")
+    parser.add_argument("--divide", action="store_true", help="Print the node count under each root move")
+    parser.add_argument("--backend", choices=BACKENDS, default="board", help="Board implementation to run on")
+    parser.add_argument("--hash", type=float, default=0, help="Transposition table size in MB, 0 to disable. Only used by single process runs")
+    parser.add_argument("--workers", type=int, default=1, help="Processes to split the root moves over, 0 for one per core")
+    parser.add_argument("--profile", action="store_true", help="Break each run down by board function, always runs in one process")
+    parser.add_argument("--json", help="Also write every run's results, profiles included, to this file as JSON")
+    args = parser.parse_args(argv)
+
+    results = runSuite(args.fen or list(REFERENCE), args.depth, args.backend, args.divide, args.hash, args.workers or None, args.profile)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+    nodes = sum(result["nodes"] for result in results)
+    elapsed = sum(result["time"] for result in results)
+    failed = [result for result in results if result["passed"] == False]
+    print(f"Total: {nodes} nodes  {elapsed:.3f}s  {nodes / elapsed if elapsed > 0 else 0:.0f} nps  {len(failed)} failed")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+import argparse, itertools, os, sys, time
+# There's no window to open, so SDL gets the dummy video driver. Audio is never started
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+import pygame
+import duck_chess, graphics
+from parallel import mapTasks
+
+# Square colors for exported boards, keyed the same way as DCRenderer's colors
+COLORS = {"White": (240, 217, 181), "Black": (181, 136, 99)}
+IMAGE_PATTERN = "{:06d}.png"
+
+# Draws the position of a FEN onto an offscreen surface size pixels wide, rounded down to a multiple of 8
+def renderFEN(fen: str, size: int = 256, colors: dict = COLORS) -> pygame.Surface:
+    square = size // 8
+    sprites = graphics.loadSprites(square, square)
+    surface = pygame.Surface((square * 8, square * 8))
+    for y, row in enumerate(duck_chess.Board(fen).getBoard()):
+        for x, piece in enumerate(row):
+            surface.fill(colors[["White", "Black"][(x + y) % 2]], (x * square, y * square, square, square))
+            if piece.code != 0:
+                surface.blit(sprites[str(piece)], (x * square, y * square))
+    return surface
+
+# Renders a chunk of FENs numbered from first. With a directory each one is saved there as a PNG and its path returned,
+# otherwise the raw RGB pixels are returned
+def _renderChunk(first: int, fens: list, size: int, colors: dict, directory: str) -> list:
+    results = []
+    for index, fen in enumerate(fens, first):
+        surface = renderFEN(fen, size, colors)
+        if directory == None:
+            results.append(pygame.image.tostring(surface, "RGB"))
+        else:
+            path = os.path.join(directory, IMAGE_PATTERN.format(index))
+            pygame.image.save(surface, path)
+            results.append(path)
+    return results
+
+# Renders every FEN in fens, in order, spread over a process pool. Writes PNGs into directory and returns their paths,
+# or with no directory returns each board's pixels as size // 8 * 8 square RGB bytes
+def renderFENs(fens, size: int = 256, directory: str = None, workers: int = None, chunk_size: int = 64, colors: dict = COLORS) -> list:
+    if directory != None:
+        os.makedirs(directory, exist_ok=True)
+    fens = iter(fens)
+    chunks = iter(lambda: list(itertools.islice(fens, chunk_size)), [])
+    results = []
+    for chunk_results in mapTasks(_renderChunk, ((index * chunk_size, chunk, size, colors, directory) for index, chunk in enumerate(chunks)), workers):
+        results += chunk_results
+    return results
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Renders board images from a file of FENs without opening a window")
+    parser.add_argument("fens", help="File with one FEN per line, - for stdin")
+    parser.add_argument("directory", help="Where the PNGs go, numbered in the order of the FENs")
+    parser.add_argument("--size", type=int, default=256, help="Image width and height in pixels")
+    parser.add_argument("--workers", type=int, default=0, help="Processes to render on, 0 for one per core")
+    parser.add_argument("--chunk-size", type=int, default=64, help="FENs handed to a worker at a time")
+    args = parser.parse_args(argv)
+
+    file = sys.stdin if args.fens == "-" else open(args.fens)
+    with file:
+        fens = [line.strip() for line in file if line.strip()]
+    start = time.perf_counter()
+    paths = renderFENs(fens, args.size, args.directory, args.workers or None, args.chunk_size)
+    elapsed = time.perf_counter() - start
+    print(f"Rendered {len(paths)} boards in {elapsed:.2f}s  {len(paths) / elapsed if elapsed > 0 else 0:.0f} boards/s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
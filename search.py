@@ -0,0 +1,318 @@
+import time
+from collections import namedtuple
+import duck_chess
+from duck_chess import STRAIGHTS, DIAGONALS
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+
+PIECE_VALUES = {"Pawn": 100, "Knight": 300, "Bishop": 320, "Rook": 500, "Queen": 900, "King": 0}
+# Scores are from the side to move's point of view, taking the enemy king is worth MATE minus the plies it takes
+MATE = 100000
+INFINITY = 1000000
+# How often, in nodes, the clock is looked at
+CHECK_INTERVAL = 1024
+
+# move is a compound move, ((pos, dest), duck_dest), pv is the line of them the search expects
+SearchResult = namedtuple("SearchResult", ["move", "score", "depth", "nodes", "time", "pv"])
+
+
+class SearchTimeout(Exception):
+    # Raised inside the search once the time or node budget runs out
+    pass
+
+
+# Packs a compound move into an int for the transposition table
+def encodeMove(move: tuple) -> int:
+    (pos, dest), duck = move
+    return (pos[1] * 8 + pos[0]) | (dest[1] * 8 + dest[0]) << 6 | (duck[1] * 8 + duck[0]) << 12
+
+def decodeMove(code: int) -> tuple:
+    pos, dest, duck = code & 63, code >> 6 & 63, code >> 12 & 63
+    return ((pos % 8, pos // 8), (dest % 8, dest // 8)), (duck % 8, duck // 8)
+
+# Static evaluation from the side to move's point of view: material, plus small bonuses for central minor pieces and advanced pawns
+def evaluate(board: duck_chess.Board) -> int:
+    score = 0
+    for color in ("White", "Black"):
+        for x, y in board.getPieces(color):
+            piece_type = board.getPiece((x, y)).getType()
+            value = PIECE_VALUES[piece_type]
+            if piece_type == "Pawn":
+                value += 5 * (6 - y if color == "White" else y - 1)
+            elif piece_type == "Knight" or piece_type == "Bishop":
+                value += 10 - 3 * (abs(2 * x - 7) + abs(2 * y - 7)) // 4
+            score += value if color == "White" else -value
+    return score if board.turn else -score
+
+# Returns whether a piece move takes something, counting en passant
+def isCapture(board: duck_chess.Board, move: tuple) -> bool:
+    pos, dest = move
+    target = board.getPiece(dest)
+    if target.getType() != None:
+        return target.getType() != "Duck" and target.getColor() != board.getPiece(pos).getColor()
+    return board.getPiece(pos).getType() == "Pawn" and pos[0] != dest[0]
+
+# Returns the side to move's piece moves, captures first (most valuable victim, least valuable attacker) then quiet moves
+def orderPieceMoves(board: duck_chess.Board, first: tuple = None, captures_only: bool = False) -> list:
+    captures, quiet = [], []
+    found_first = False
+    for move in board.generateMoves(captures_only=captures_only, piece_moves_only=True):
+        pos, dest = move
+        # The first move usually comes from the transposition table, so it's only used if it really is a move here
+        if move == first:
+            found_first = True
+            continue
+        if isCapture(board, move):
+            victim = board.getPiece(dest).getType()
+            captures.append((-(PIECE_VALUES[victim] if victim else 100) * 10 + PIECE_VALUES[board.getPiece(pos).getType()], move))
+        else:
+            quiet.append(move)
+    captures.sort()
+    ordered = [move for _, move in captures] + quiet
+    return ([first] if found_first else []) + ordered
+
+# Returns the squares between the enemy's rooks, bishops and queens and the pieces of color they could take next move
+def blockingSquares(board: duck_chess.Board, color: str) -> set:
+    squares = set()
+    for x, y in board.getPieces(color):
+        for directions, slider_type in ((STRAIGHTS, "Rook"), (DIAGONALS, "Bishop")):
+            for x_step, y_step in directions:
+                between = []
+                check_x, check_y = x + x_step, y + y_step
+                while 0 <= check_x < 8 and 0 <= check_y < 8:
+                    target = board.getPiece((check_x, check_y))
+                    if target.getType() != None:
+                        if target.getColor() not in (color, "Duck") and target.getType() in (slider_type, "Queen"):
+                            squares.update(between)
+                        break
+                    between.append((check_x, check_y))
+                    check_x, check_y = check_x + x_step, check_y + y_step
+    return squares
+
+# Returns duck squares for the side that just moved a piece, best first: squares that shield their pieces from enemy sliders,
+# then squares next to the enemy king, then squares on the enemy's lines of attack. width limits how many are returned
+def orderDuckMoves(board: duck_chess.Board, width: int = None, first: tuple = None) -> list:
+    color = board.getTurn()
+    enemy = "Black" if color == "White" else "White"
+    blocking = blockingSquares(board, color)
+    king = board.kings[enemy]
+    scored = []
+    for square in board.getAvailableMoves(board.duck_pos):
+        score = 0
+        if square == first:
+            score += 100
+        if square in blocking:
+            score += 4
+        if king != None and max(abs(square[0] - king[0]), abs(square[1] - king[1])) == 1:
+            score += 2
+        if board.isAttacked(square, enemy):
+            score += 1
+        scored.append((-score, square[1], square[0], square))
+    scored.sort()
+    return [square for *_, square in scored[:width]]
+
+
+class Search():
+    # Iterative deepening alpha-beta over compound moves. duck_width is how many duck squares are tried after each piece move,
+    # tablebase is a tablebase.Tablebase whose results replace searching the positions it covers
+    def __init__(self, board: duck_chess.Board, hash_mb: float = 16, duck_width: int = 6, tablebase=None) -> None:
+        self.board = board
+        self.tablebase = tablebase
+        self.table = TranspositionTable(hash_mb)
+        self.duck_width = duck_width
+        self.nodes = 0
+        self.deadline = None
+        self.node_limit = None
+        self.stop = None
+        # Limits are ignored during the first iteration, so there is always a move to return
+        self.stoppable = False
+
+    # Searches the current position until depth, movetime (seconds) or nodes runs out, whichever comes first.
+    # callback is called with a SearchResult after every finished iteration. stop is anything with an is_set method, like
+    # a threading or multiprocessing Event, the search ends early once it's set
+    def search(self, depth: int = None, movetime: float = None, nodes: int = None, callback=None, stop=None) -> SearchResult:
+        if depth == None and movetime == None and nodes == None and stop == None:
+            raise ValueError("Search needs a depth, movetime, node limit or stop event")
+        start = time.perf_counter()
+        self.deadline = start + movetime if movetime != None else None
+        self.node_limit = nodes
+        self.stop = stop
+        self.nodes = 0
+        history_length = len(self.board.history)
+
+        result = None
+        if self.board.isKingTaken():
+            return result
+        current_depth = 0
+        while depth == None or current_depth < depth:
+            current_depth += 1
+            self.stoppable = current_depth > 1
+            try:
+                score, move = self.searchRoot(current_depth)
+            except SearchTimeout:
+                while len(self.board.history) > history_length:
+                    self.board.unmakeMove()
+                break
+            result = SearchResult(move, score, current_depth, self.nodes, time.perf_counter() - start, self.getPV(current_depth))
+            if callback != None:
+                callback(result)
+            # No moves, or a forced king capture found, deeper searches won't change anything
+            if move == None or abs(score) >= MATE - 1000:
+                break
+        return result
+
+    # Searches every root move, returning (score, best compound move). The root is never cut off by the transposition
+    # table, a draw rule or the tablebase, so there is always a move when one exists
+    def searchRoot(self, depth: int) -> tuple:
+        self.nodes += 1
+        self.checkLimits()
+        key = self.board.getKey()
+        entry = self.table.probe(key)
+        table_move = decodeMove(entry[3]) if entry != None and entry[3] >= 0 else None
+        best_score, best_move = self.searchMoves(depth, -INFINITY, INFINITY, 0, table_move)
+        # Not being able to move a piece counts as a draw
+        if best_move == None:
+            return 0, None
+        self.table.store(key, depth, toTable(best_score, 0), EXACT, encodeMove(best_move))
+        return best_score, best_move
+
+    def checkLimits(self) -> None:
+        if not self.stoppable:
+            return
+        if self.node_limit != None and self.nodes >= self.node_limit:
+            raise SearchTimeout()
+        if self.nodes % CHECK_INTERVAL == 0:
+            if self.deadline != None and time.perf_counter() >= self.deadline:
+                raise SearchTimeout()
+            if self.stop != None and self.stop.is_set():
+                raise SearchTimeout()
+
+    def negamax(self, depth: int, alpha: int, beta: int, ply: int) -> int:
+        board = self.board
+        self.nodes += 1
+        self.checkLimits()
+        if board.isKingTaken():
+            return -MATE + ply
+        # Repetitions and the fifty move rule draw, running out of piece moves is found below
+        if board.isDrawByRule():
+            return 0
+        # Tablebase distances count plies to taking the king, the same as MATE scores
+        if self.tablebase != None:
+            probe = self.tablebase.probe(board)
+            if probe != None:
+                result, distance = probe
+                return 0 if result == "draw" else MATE - ply - distance if result == "win" else -MATE + ply + distance
+        if depth <= 0:
+            return self.quiesce(alpha, beta, ply)
+
+        key = board.getKey()
+        entry = self.table.probe(key)
+        table_move = None
+        if entry != None:
+            entry_depth, value, flag, code = entry
+            if code >= 0:
+                table_move = decodeMove(code)
+            value = fromTable(value, ply)
+            if entry_depth >= depth:
+                if flag == EXACT or (flag == LOWER and value >= beta) or (flag == UPPER and value <= alpha):
+                    return value
+
+        alpha_start = alpha
+        best_score, best_move = self.searchMoves(depth, alpha, beta, ply, table_move)
+        # Not being able to move a piece counts as a draw
+        if best_move == None:
+            return 0
+
+        flag = UPPER if best_score <= alpha_start else LOWER if best_score >= beta else EXACT
+        self.table.store(key, depth, toTable(best_score, ply), flag, encodeMove(best_move))
+        return best_score
+
+    # Plays every piece move with its best looking duck squares, table_move's first, and returns (best score, best
+    # compound move), stopping once a move reaches beta. The move is None when there are no piece moves
+    def searchMoves(self, depth: int, alpha: int, beta: int, ply: int, table_move: tuple = None) -> tuple:
+        board = self.board
+        best_score, best_move = -INFINITY, None
+        for move in orderPieceMoves(board, table_move[0] if table_move else None):
+            board.makeMove(move)
+            duck_first = table_move[1] if table_move and table_move[0] == move else None
+            for duck in orderDuckMoves(board, self.duck_width, duck_first):
+                board.makeMove((board.duck_pos, duck))
+                score = -self.negamax(depth - 1, -beta, -alpha, ply + 1)
+                board.unmakeMove()
+                if score > best_score:
+                    best_score, best_move = score, (move, duck)
+                    alpha = max(alpha, score)
+                if alpha >= beta:
+                    break
+            board.unmakeMove()
+            if alpha >= beta:
+                break
+        return best_score, best_move
+
+    # Only plays captures (each with its best looking duck square) until the position is quiet
+    def quiesce(self, alpha: int, beta: int, ply: int) -> int:
+        board = self.board
+        self.nodes += 1
+        self.checkLimits()
+        if board.isKingTaken():
+            return -MATE + ply
+        stand_pat = evaluate(board)
+        if stand_pat >= beta:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+
+        for move in orderPieceMoves(board, captures_only=True):
+            board.makeMove(move)
+            ducks = orderDuckMoves(board, 1)
+            if ducks:
+                board.makeMove((board.duck_pos, ducks[0]))
+                score = -self.quiesce(-beta, -alpha, ply + 1)
+                board.unmakeMove()
+            else:
+                score = -INFINITY
+            board.unmakeMove()
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    break
+        return alpha
+
+    # Follows best moves through the transposition table
+    def getPV(self, depth: int) -> list:
+        pv = []
+        for _ in range(depth):
+            entry = self.table.probe(self.board.getKey())
+            if entry == None or entry[3] < 0:
+                break
+            move = decodeMove(entry[3])
+            if not self.isLegal(move):
+                break
+            pv.append(move)
+            self.board.makeMove(move[0])
+            self.board.makeMove((self.board.duck_pos, move[1]))
+        for _ in pv:
+            self.board.unmakeMove()
+            self.board.unmakeMove()
+        return pv
+
+    # Checks a compound move from the transposition table can actually be played here
+    def isLegal(self, move: tuple) -> bool:
+        (pos, dest), duck = move
+        board = self.board
+        if board.getPiece(pos).getColor() != board.getTurn() or dest not in board.getAvailableMoves(pos):
+            return False
+        return board.isDuckSquare(pos, dest, duck)
+
+# Mate scores are stored relative to the node, so they stay right when the position is reached at another ply
+def toTable(score: int, ply: int) -> int:
+    if score >= MATE - 1000:
+        return score + ply
+    if score <= -MATE + 1000:
+        return score - ply
+    return score
+
+def fromTable(score: int, ply: int) -> int:
+    if score >= MATE - 1000:
+        return score - ply
+    if score <= -MATE + 1000:
+        return score + ply
+    return score
@@ -0,0 +1,209 @@
+import argparse, glob, json, os, random, sys, time
+import numpy as np
+import duck_chess, encoder
+from search import Search
+from mcts import MCTS, materialEvaluator
+from tablebase import Tablebase
+from parallel import mapTasks
+
+# One record per position played. planes is encoder.encode's output bit packed (np.unpackbits undoes it, see unpackPlanes),
+# the move is the piece move and duck square played from the position, and result is 1, 0 or -1 for the side to move
+RECORD_DTYPE = np.dtype([
+    ("planes", np.uint8, (len(encoder.PLANES) * 64 // 8,)),
+    ("move_from", np.uint8),
+    ("move_to", np.uint8),
+    ("duck", np.uint8),
+    ("result", np.int8),
+    ("ply", np.uint16),
+    ("game", np.uint32),
+])
+SHARD_PATTERN = "shard-{:06d}.bin"
+# Written next to the shards with the settings that decide what goes in each one, so a resumed run can check it matches
+SETTINGS_FILE = "selfplay.json"
+
+
+# Picks a random piece move, then a random square for the duck
+def randomPolicy(board: duck_chess.Board, rng: random.Random) -> tuple:
+    moves = list(board.generateMoves(piece_moves_only=True))
+    move = rng.choice(moves)
+    board.makeMove(move)
+    duck = rng.choice(board.getAvailableMoves(board.duck_pos))
+    board.unmakeMove()
+    return move, duck
+
+class SearchPolicy():
+    # Plays the search's best move with a node budget, with the first random_plies of each game played at random for variety
+    def __init__(self, nodes: int = 2000, hash_mb: float = 4, duck_width: int = 6, random_plies: int = 4, tablebase=None) -> None:
+        self.nodes = nodes
+        self.tablebase = tablebase
+        self.hash_mb = hash_mb
+        self.duck_width = duck_width
+        self.random_plies = random_plies
+
+    def __call__(self, board: duck_chess.Board, rng: random.Random) -> tuple:
+        if len(board.history) < self.random_plies * 2:
+            return randomPolicy(board, rng)
+        result = Search(board, self.hash_mb, self.duck_width, self.tablebase).search(nodes=self.nodes)
+        if result == None or result.move == None:
+            return randomPolicy(board, rng)
+        return result.move
+
+class MCTSPolicy():
+    # Plays the most visited move after a number of simulations, with the first random_plies played at random. The tree is
+    # kept between calls on the same board and moved along the moves played since, so the subtree under them is reused
+    def __init__(self, simulations: int = 800, evaluator=materialEvaluator, batch_size: int = 16, random_plies: int = 4) -> None:
+        self.simulations = simulations
+        self.evaluator = evaluator
+        self.batch_size = batch_size
+        self.random_plies = random_plies
+        self.mcts = None
+        self.board = None
+        self.played = 0
+
+    def __call__(self, board: duck_chess.Board, rng: random.Random) -> tuple:
+        history = board.history
+        if len(history) < self.random_plies * 2:
+            return randomPolicy(board, rng)
+        if self.mcts == None or self.board is not board or len(history) < self.played:
+            self.mcts = MCTS(board, self.evaluator, self.batch_size)
+        else:
+            for ply in range(self.played, len(history), 2):
+                self.mcts.advance(((history[ply].pos, history[ply].dest), history[ply + 1].dest))
+        self.board, self.played = board, len(history)
+        result = self.mcts.search(self.simulations)
+        if result == None or result.move == None:
+            return randomPolicy(board, rng)
+        return result.move
+
+POLICIES = {"random": randomPolicy, "search": SearchPolicy(), "mcts": MCTSPolicy()}
+
+
+# Plays one game, returning the FEN before every ply, the compound move played from it and the result from White's side.
+# Losing your king loses, and running out of piece moves, 100 halfmoves, threefold repetition or max_plies is a draw
+def playGame(policy, rng: random.Random, fen: str = duck_chess.DEFAULT_FEN, max_plies: int = 400) -> tuple:
+    board = duck_chess.Board(fen)
+    fens, moves = [], []
+    result = 0
+    for _ in range(max_plies):
+        state = board.getGameState()
+        if state == "win":
+            result = -1 if board.turn else 1
+        if state != None:
+            break
+        fens.append(board.getFEN())
+        move, duck = policy(board, rng)
+        moves.append((move, duck))
+        board.makeMove(move)
+        board.makeMove((board.duck_pos, duck))
+    return fens, moves, result
+
+# Turns a played game into records
+def gameRecords(game: int, fens: list, moves: list, result: int) -> np.ndarray:
+    records = np.zeros(len(fens), dtype=RECORD_DTYPE)
+    if not fens:
+        return records
+    planes = encoder.encode(fens)
+    records["planes"] = np.packbits(planes.reshape(len(fens), -1), axis=1)
+    records["move_from"] = [pos[1] * 8 + pos[0] for (pos, _), _ in moves]
+    records["move_to"] = [dest[1] * 8 + dest[0] for (_, dest), _ in moves]
+    records["duck"] = [duck[1] * 8 + duck[0] for _, duck in moves]
+    white_to_move = planes[:, encoder.TURN_PLANE, 0, 0] == 1
+    records["result"] = np.where(white_to_move, result, -result)
+    records["ply"] = np.arange(len(fens))
+    records["game"] = game
+    return records
+
+# Plays games [first_game, first_game + games) and writes them to one shard. Each game is seeded from its number,
+# so a shard comes out the same whichever worker plays it. The shard only appears under its real name once complete
+def _runShard(directory: str, shard: int, first_game: int, games: int, policy, fen: str, max_plies: int, seed: int) -> tuple:
+    path = os.path.join(directory, SHARD_PATTERN.format(shard))
+    temporary = path + ".tmp"
+    positions = 0
+    with open(temporary, "wb") as file:
+        for game in range(first_game, first_game + games):
+            records = gameRecords(game, *playGame(policy, random.Random(seed * 1000003 + game), fen, max_plies))
+            file.write(records.tobytes())
+            positions += len(records)
+    os.replace(temporary, path)
+    return games, positions
+
+# Checks directory's shards were made with the same settings, raising ValueError if they weren't, and records the
+# settings for the next run if there's nothing to check against yet
+def checkSettings(directory: str, settings: dict) -> None:
+    path = os.path.join(directory, SETTINGS_FILE)
+    if os.path.exists(path):
+        with open(path) as file:
+            stored = json.load(file)
+        changed = [name for name in settings if stored.get(name) != settings[name]]
+        if changed:
+            raise ValueError(f"{directory} has shards made with different settings: " + ", ".join(f"{name} was {stored.get(name)!r}, now {settings[name]!r}" for name in changed))
+        return
+    with open(path, "w") as file:
+        json.dump(settings, file, indent=2)
+
+# Generates games into directory, games_per_shard to a file, spread over a process pool. Shards already in the directory
+# are skipped, so an interrupted run picks up where it stopped when run again with the same arguments. Raises ValueError
+# if the shards there were made with another games_per_shard, policy, fen, max_plies or seed.
+# Returns the number of positions written by this run
+def selfPlay(directory: str, games: int, workers: int = None, games_per_shard: int = 100, policy=randomPolicy, fen: str = duck_chess.DEFAULT_FEN, max_plies: int = 400, seed: int = 0, output=sys.stdout) -> int:
+    os.makedirs(directory, exist_ok=True)
+    checkSettings(directory, {"games_per_shard": games_per_shard, "policy": getattr(policy, "__name__", type(policy).__name__), "fen": fen, "max_plies": max_plies, "seed": seed})
+    tasks = []
+    for shard, first_game in enumerate(range(0, games, games_per_shard)):
+        if not os.path.exists(os.path.join(directory, SHARD_PATTERN.format(shard))):
+            tasks.append((directory, shard, first_game, min(games_per_shard, games - first_game), policy, fen, max_plies, seed))
+    if output and len(tasks) < -(-games // games_per_shard):
+        print(f"Resuming, {-(-games // games_per_shard) - len(tasks)} shards already done", file=output)
+
+    start = time.perf_counter()
+    played, positions = 0, 0
+
+    def report(result: tuple) -> None:
+        nonlocal played, positions
+        played += result[0]
+        positions += result[1]
+        if output:
+            elapsed = time.perf_counter() - start
+            print(f"Games: {played}  Positions: {positions}  {positions / elapsed if elapsed > 0 else 0:.0f} positions/s", file=output)
+
+    for result in mapTasks(_runShard, tasks, workers, ordered=False):
+        report(result)
+    return positions
+
+# Memory maps every finished shard in a directory, without reading them in
+def loadShards(directory: str) -> list:
+    return [np.memmap(path, dtype=RECORD_DTYPE, mode="r") for path in sorted(glob.glob(os.path.join(directory, SHARD_PATTERN.replace("{:06d}", "*")))) if os.path.getsize(path)]
+
+# Unpacks the planes of some records back into the (N, len(PLANES), 8, 8) layout encoder.encode gives
+def unpackPlanes(records: np.ndarray) -> np.ndarray:
+    return np.unpackbits(records["planes"], axis=1).reshape(len(records), len(encoder.PLANES), 8, 8)
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Plays duck chess games against itself and writes the positions to memory mappable shards")
+    parser.add_argument("directory", help="Where the shards go, finished shards already there are kept and skipped")
+    parser.add_argument("--games", type=int, default=1000, help="Total games, counting ones from earlier runs")
+    parser.add_argument("--games-per-shard", type=int, default=100, help="Games written to each shard file")
+    parser.add_argument("--workers", type=int, default=0, help="Processes to play games on, 0 for one per core")
+    parser.add_argument("--policy", choices=POLICIES, default="random", help="How moves are picked")
+    parser.add_argument("--nodes", type=int, default=2000, help="Node budget per move for the search policy, or simulations per move for mcts")
+    parser.add_argument("--fen", default=duck_chess.DEFAULT_FEN, help="Position every game starts from")
+    parser.add_argument("--max-plies", type=int, default=400, help="Games still going after this many plies are drawn")
+    parser.add_argument("--tablebase", help="Directory of endgame tables the search policy probes")
+    parser.add_argument("--seed", type=int, default=0, help="Base seed, games are seeded from it and their number")
+    args = parser.parse_args(argv)
+
+    if args.policy == "search":
+        policy = SearchPolicy(args.nodes, tablebase=Tablebase(args.tablebase) if args.tablebase else None)
+    elif args.policy == "mcts":
+        policy = MCTSPolicy(args.nodes)
+    else:
+        policy = POLICIES[args.policy]
+    try:
+        selfPlay(args.directory, args.games, args.workers or None, args.games_per_shard, policy, args.fen, args.max_plies, args.seed)
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
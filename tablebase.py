@@ -0,0 +1,325 @@
+import argparse, os, sys, time
+import numpy as np
+import duck_chess
+from parallel import mapTasks, chunkSize
+
+# A material lists White's pieces then Black's, strongest first, like "KRvK" or "KPvK". Tables are only built with the
+# stronger side as White, positions with the colors the other way round are mirrored top to bottom to look them up.
+# Every position is one byte, indexed by ((side to move * 64 ** pieces + piece squares) * 64 + duck square), where side
+# to move is 0 for White and the piece squares are base 64 digits in material order. The byte is the distance in plies
+# to taking the enemy king: odd is a win for the side to move, even a loss and 0 a draw (or a square the duck can't be on)
+PIECE_LETTERS = "KQRBNP"
+LETTER_TYPES = {"K": "King", "Q": "Queen", "R": "Rook", "B": "Bishop", "N": "Knight", "P": "Pawn"}
+# Letters indexed by duck_chess type id
+TYPE_LETTERS = "PNBRQK"
+FILE_PATTERN = "{}.tb"
+MAX_DISTANCE = 255
+# Stands for "no such distance" while solving
+INF = 0xFFFF
+EMPTY_FEN = "8/8/8/8/8/8/8/8 w - - 0 1"
+# Move kinds: to a position in the same table, to a position in a smaller table after a capture, or taking the king
+SAME, SUB, KING = range(3)
+# How many rows of 64 duck squares are worked on at once while solving
+ROW_CHUNK = 1 << 15
+
+
+# Sorts a side's pieces strongest first
+def sideLetters(letters) -> str:
+    return "".join(sorted(letters, key=PIECE_LETTERS.index))
+
+def sideStrength(side: str) -> tuple:
+    return (len(side), tuple(-PIECE_LETTERS.index(letter) for letter in side))
+
+# Returns the material the table for these two sides is stored under, and whether the colors have to be swapped for it
+def canonicalMaterial(white: str, black: str) -> tuple:
+    white, black = sideLetters(white), sideLetters(black)
+    if sideStrength(black) > sideStrength(white):
+        return f"{black}v{white}", True
+    return f"{white}v{black}", False
+
+# The (letter, color id) of every piece of a material, in the order their squares are indexed
+def materialSlots(material: str) -> list:
+    white, black = material.split("v")
+    return [(letter, duck_chess.WHITE) for letter in white] + [(letter, duck_chess.BLACK) for letter in black]
+
+# The materials left after each piece but a king is taken, so their tables have to be built first
+def subMaterials(material: str) -> list:
+    white, black = material.split("v")
+    subs = []
+    for side, other, is_white in ((white, black, True), (black, white, False)):
+        for i, letter in enumerate(side):
+            if letter != "K":
+                rest = side[:i] + side[i + 1:]
+                sub = canonicalMaterial(rest, other) if is_white else canonicalMaterial(other, rest)
+                if sub[0] not in subs:
+                    subs.append(sub[0])
+    return subs
+
+def configIndex(squares: list) -> int:
+    index = 0
+    for sq in squares:
+        index = index * 64 + sq
+    return index
+
+def configSquares(index: int, count: int) -> list:
+    squares = []
+    for _ in range(count):
+        squares.append(index % 64)
+        index //= 64
+    return squares[::-1]
+
+# Finds the table and row of a position given as (letter, color id, square) pieces, returns (material, row, flipped).
+# Squares are y * 8 + x, a flipped position has its squares mirrored with ^ 56, the duck's included
+def locate(pieces: list, white_to_move: bool) -> tuple:
+    white = sideLetters(letter for letter, color, _ in pieces if color == duck_chess.WHITE)
+    black = sideLetters(letter for letter, color, _ in pieces if color == duck_chess.BLACK)
+    material, flipped = canonicalMaterial(white, black)
+    if flipped:
+        pieces = [(letter, 1 - color, sq ^ 56) for letter, color, sq in pieces]
+        white_to_move = not white_to_move
+    remaining = list(pieces)
+    squares = []
+    for slot in materialSlots(material):
+        for i, (letter, color, sq) in enumerate(remaining):
+            if (letter, color) == slot:
+                squares.append(sq)
+                del remaining[i]
+                break
+    return material, (0 if white_to_move else 1) * 64 ** len(squares) + configIndex(squares), flipped
+
+# Which duck squares are free in each of a run of piece configurations, as a (len(configs), 64) bool array
+def freeSquares(configs: np.ndarray, count: int) -> np.ndarray:
+    free = np.ones((len(configs), 64), dtype=bool)
+    rows = np.arange(len(configs))
+    for i in range(count):
+        free[rows, configs // 64 ** (count - 1 - i) % 64] = False
+    return free
+
+# Enumerates the piece moves of configurations first to last with duck_chess.Board, for both sides to move and every duck
+# square. A move is kept once per configuration with a bitmask of the duck squares it can be played with.
+# Returns the arrays (source row, kind, destination row, sub material index, flipped, duck mask)
+def _enumerateChunk(material: str, first: int, last: int) -> tuple:
+    slots = materialSlots(material)
+    count = len(slots)
+    configs = 64 ** count
+    subs = subMaterials(material)
+    board = duck_chess.Board(EMPTY_FEN)
+    moves = []
+    for config in range(first, last):
+        squares = configSquares(config, count)
+        if len(set(squares)) < count:
+            continue
+        at = {sq: i for i, sq in enumerate(squares)}
+        board.changeSquares([((sq % 8, sq // 8), duck_chess.PIECES[(LETTER_TYPES[letter], duck_chess.COLORS[color])]) for (letter, color), sq in zip(slots, squares)])
+        for side in (duck_chess.WHITE, duck_chess.BLACK):
+            masks = {}
+            for duck in range(64):
+                if duck in at:
+                    continue
+                board.changeSquares([((duck % 8, duck // 8), duck_chess.PIECES[("Duck", "Duck")])])
+                for move in board.generateMoves(duck_chess.COLORS[side], piece_moves_only=True):
+                    masks[move] = masks.get(move, 0) | (1 << duck)
+                board.changeSquares([((duck % 8, duck // 8), duck_chess.EMPTY)])
+            for ((x, y), (dest_x, dest_y)), mask in masks.items():
+                pos, dest = y * 8 + x, dest_y * 8 + dest_x
+                moved, captured = at[pos], at.get(dest)
+                after = list(squares)
+                after[moved] = dest
+                if captured == None:
+                    moves.append((side * configs + config, SAME, (1 - side) * configs + configIndex(after), 0, False, mask))
+                elif slots[captured][0] == "K":
+                    moves.append((side * configs + config, KING, 0, 0, False, mask))
+                else:
+                    pieces = [(letter, color, sq) for i, ((letter, color), sq) in enumerate(zip(slots, after)) if i != captured]
+                    sub, row, flipped = locate(pieces, side == duck_chess.BLACK)
+                    moves.append((side * configs + config, SUB, row, subs.index(sub), flipped, mask))
+        board.changeSquares([((sq % 8, sq // 8), duck_chess.EMPTY) for sq in squares])
+    if not moves:
+        return tuple(np.zeros(0, dtype=dtype) for dtype in (np.int64, np.int8, np.int64, np.int8, bool, np.uint64))
+    columns = list(zip(*moves))
+    return (np.array(columns[0], dtype=np.int64), np.array(columns[1], dtype=np.int8), np.array(columns[2], dtype=np.int64),
+            np.array(columns[3], dtype=np.int8), np.array(columns[4], dtype=bool), np.array(columns[5], dtype=np.uint64))
+
+# Works out, for rows of positions that are the result of a piece move, what the side that moved gets for each square the
+# duck stood on before the move, given that it has to go somewhere else. values and free are (rows, 64) arrays over where
+# the duck goes now. Returns (win, loss): the distance the mover wins in by placing the duck on the best losing square for
+# the opponent, and the distance it loses in if every square wins for the opponent, both INF when there isn't one
+def summarize(values: np.ndarray, free: np.ndarray) -> tuple:
+    values = values.astype(np.uint16)
+    rows = np.arange(len(values))
+    columns = np.arange(64)
+    # The best and second best squares, so the one the duck is leaving can be skipped
+    losses = np.where(free & (values > 0) & (values % 2 == 0), values, INF)
+    first = losses.argmin(axis=1)
+    best = losses[rows, first]
+    losses[rows, first] = INF
+    second = losses.min(axis=1)
+    loss = np.where(columns == first[:, None], second[:, None], best[:, None])
+    win = np.where(loss == INF, INF, loss + 1)
+
+    wins = free & (values % 2 == 1)
+    others = free & ~wins
+    distances = np.where(wins, values, 0)
+    first = distances.argmax(axis=1)
+    longest = distances[rows, first]
+    distances[rows, first] = 0
+    second = distances.max(axis=1)
+    longest = np.where(columns == first[:, None], second[:, None], longest[:, None])
+    lose = np.where(others.sum(axis=1)[:, None] - others == 0, longest + 1, INF)
+    return win.astype(np.uint16), lose.astype(np.uint16)
+
+# Summarizes every row of a table into (win, loss) arrays
+def summarizeTable(values: np.ndarray, count: int) -> tuple:
+    win, loss = np.empty(values.shape, dtype=np.uint16), np.empty(values.shape, dtype=np.uint16)
+    configs = 64 ** count
+    for start in range(0, len(values), ROW_CHUNK):
+        stop = min(start + ROW_CHUNK, len(values))
+        free = freeSquares(np.arange(start, stop) % configs, count)
+        win[start:stop], loss[start:stop] = summarize(values[start:stop], free)
+    return win, loss
+
+# Retrograde analysis of a material whose smaller tables are already in directory. Returns the (rows, 64) values
+def solve(directory: str, material: str, workers: int = None, output=sys.stdout) -> np.ndarray:
+    count = len(materialSlots(material))
+    configs = 64 ** count
+    start = time.perf_counter()
+
+    chunk_size = chunkSize(configs, workers)
+    chunks = [(material, first, min(first + chunk_size, configs)) for first in range(0, configs, chunk_size)]
+    parts = list(mapTasks(_enumerateChunk, chunks, workers))
+    source, kind, target, sub, flipped, mask = (np.concatenate(column) for column in zip(*parts))
+    order = np.argsort(source, kind="stable")
+    source, kind, target, sub, flipped, mask = source[order], kind[order], target[order], sub[order], flipped[order], mask[order]
+    if output:
+        print(f"{material}: {len(source)} piece moves enumerated in {time.perf_counter() - start:.1f}s", file=output)
+
+    # Moves into smaller tables and king captures come out the same every round, so they are worked out once
+    fixed = np.flatnonzero(kind != SAME)
+    fixed_win = np.full((len(fixed), 64), INF, dtype=np.uint16)
+    fixed_loss = np.full((len(fixed), 64), INF, dtype=np.uint16)
+    fixed_win[kind[fixed] == KING] = 1
+    for index, name in enumerate(subMaterials(material)):
+        moves = np.flatnonzero(kind[fixed] == SUB)
+        moves = moves[sub[fixed[moves]] == index]
+        if not len(moves):
+            continue
+        table = np.memmap(os.path.join(directory, FILE_PATTERN.format(name)), dtype=np.uint8, mode="r").reshape(-1, 64)
+        rows = target[fixed[moves]]
+        win, loss = summarize(np.asarray(table[rows]), freeSquares(rows % 64 ** len(materialSlots(name)), len(materialSlots(name))))
+        # Flipped tables have their duck squares mirrored too
+        columns = np.where(flipped[fixed[moves]][:, None], np.arange(64) ^ 56, np.arange(64))
+        fixed_win[moves] = np.take_along_axis(win, columns, axis=1)
+        fixed_loss[moves] = np.take_along_axis(loss, columns, axis=1)
+    fixed_at = np.full(len(source), -1, dtype=np.int64)
+    fixed_at[fixed] = np.arange(len(fixed))
+    finite = np.concatenate([fixed_win[fixed_win != INF], fixed_loss[fixed_loss != INF], [0]])
+    longest_fixed = int(finite.max())
+
+    # Moves are worked through in runs that don't split a position's moves
+    starts = np.flatnonzero(np.r_[True, source[1:] != source[:-1]])
+    bounds = list(starts[::max(1, len(starts) // max(1, len(source) // (ROW_CHUNK * 4)))]) + [len(source)]
+    values = np.zeros((2 * configs, 64), dtype=np.uint8)
+    for distance in range(1, MAX_DISTANCE + 1):
+        win, loss = summarizeTable(values, count)
+        found = 0
+        for low, high in zip(bounds, bounds[1:]):
+            if low == high:
+                continue
+            same = kind[low:high] == SAME
+            move_win = np.empty((high - low, 64), dtype=np.uint16)
+            move_loss = np.empty((high - low, 64), dtype=np.uint16)
+            move_win[same], move_loss[same] = win[target[low:high][same]], loss[target[low:high][same]]
+            move_win[~same], move_loss[~same] = fixed_win[fixed_at[low:high][~same]], fixed_loss[fixed_at[low:high][~same]]
+            legal = np.unpackbits(mask[low:high].view(np.uint8).reshape(-1, 8), axis=1, bitorder="little").astype(bool)
+            segments = starts[(starts >= low) & (starts < high)] - low
+            rows = source[low:high][segments]
+            best = np.minimum.reduceat(np.where(legal, move_win, INF), segments, axis=0)
+            worst = np.maximum.reduceat(np.where(legal, move_loss, 0), segments, axis=0)
+            has_moves = np.logical_or.reduceat(legal, segments, axis=0)
+            current = values[rows]
+            wins = (current == 0) & (best <= distance)
+            losses = (current == 0) & has_moves & (worst <= distance) & ~wins
+            found += int(wins.sum() + losses.sum())
+            values[rows] = np.where(wins, best, np.where(losses, worst, current))
+        if output:
+            print(f"{material}: distance {distance}, {found} positions", file=output)
+        if found == 0 and distance > longest_fixed:
+            break
+    else:
+        if output:
+            print(f"{material}: stopped at {MAX_DISTANCE} plies, anything longer is stored as a draw", file=output)
+    return values
+
+# Builds the table for a material into directory, after the tables it depends on. Tables already there are kept
+def build(directory: str, material: str, workers: int = None, output=sys.stdout) -> str:
+    white, black = material.split("v")
+    material, _ = canonicalMaterial(white, black)
+    if "K" not in white or "K" not in black:
+        raise ValueError(f"Both sides need a king: '{material}'")
+    path = os.path.join(directory, FILE_PATTERN.format(material))
+    if os.path.exists(path):
+        return path
+    os.makedirs(directory, exist_ok=True)
+    for sub in subMaterials(material):
+        build(directory, sub, workers, output)
+    start = time.perf_counter()
+    values = solve(directory, material, workers, output)
+    temporary = path + ".tmp"
+    values.tofile(temporary)
+    os.replace(temporary, path)
+    if output:
+        print(f"{material}: written to {path} in {time.perf_counter() - start:.1f}s", file=output)
+    return path
+
+class Tablebase():
+    # Looks positions up in the tables of a directory, memory mapping each table the first time it's needed,
+    # so only the pages actually probed are ever read in
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self.tables = {}
+        names = [name[:-len(FILE_PATTERN.format(""))] for name in os.listdir(directory) if name.endswith(FILE_PATTERN.format(""))] if os.path.isdir(directory) else []
+        # Positions with more pieces than the biggest table are turned away before anything else is done
+        self.max_pieces = max((len(name) - 1 for name in names), default=0)
+
+    # Only the directory is sent to other processes, they map the tables themselves
+    def __reduce__(self) -> tuple:
+        return (Tablebase, (self.directory,))
+
+    def getTable(self, material: str) -> np.memmap or None:
+        if material not in self.tables:
+            path = os.path.join(self.directory, FILE_PATTERN.format(material))
+            self.tables[material] = np.memmap(path, dtype=np.uint8, mode="r") if os.path.exists(path) else None
+        return self.tables[material]
+
+    # Returns ("win", plies), ("loss", plies) or ("draw", 0) for the side to move on either backend, or None when the
+    # position isn't covered: no table for its material, the duck still to be placed or off the board, or en passant possible
+    def probe(self, board: duck_chess.Board) -> tuple or None:
+        found = [(color_id, pos) for color_id, color in enumerate(("White", "Black")) for pos in board.getPieces(color)]
+        if len(found) > self.max_pieces:
+            return None
+        if board.duck_turn or board.passant not in (None, "-") or board.duck_pos[1] >= 8:
+            return None
+        pieces = [(TYPE_LETTERS[board.getPiece(pos).type_id], color_id, pos[1] * 8 + pos[0]) for color_id, pos in found]
+        material, row, flipped = locate(pieces, board.turn)
+        table = self.getTable(material)
+        if table is None:
+            return None
+        duck = board.duck_pos[1] * 8 + board.duck_pos[0]
+        value = int(table[row * 64 + (duck ^ 56 if flipped else duck)])
+        if value == 0:
+            return ("draw", 0)
+        return ("win", value) if value % 2 else ("loss", value)
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Builds endgame tablebases by retrograde analysis, one memory mappable file per material")
+    parser.add_argument("directory", help="Where the tables go, tables already there are kept")
+    parser.add_argument("materials", nargs="+", help="Materials to build, White's pieces then Black's, like KRvK or KPvK")
+    parser.add_argument("--workers", type=int, default=0, help="Processes to enumerate moves on, 0 for one per core")
+    args = parser.parse_args(argv)
+
+    for material in args.materials:
+        build(args.directory, material, args.workers or None)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
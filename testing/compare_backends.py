@@ -0,0 +1,147 @@
+import random, sys, time
+sys.path.insert(0, "../")
+import duck_chess, bitboard
+
+# Positions the two backends are checked against, plus random games played out from each of them
+POSITIONS = [
+    duck_chess.DEFAULT_FEN,
+    "r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4",
+    "rnbqkbnr/ppp1pppp/8/3pP3/8/3D4/PPPP1PPP/RNBQKBNR w KQkq d6 0 3",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+    "4k3/8/3D4/8/8/8/8/R3K3 b - - 0 1",
+    "3qk3/8/8/3Q4/8/8/8/4K3 w - - 0 1",
+]
+
+def findDuck(board) -> tuple:
+    for y, row in enumerate(board.getBoard()):
+        for x, piece in enumerate(row):
+            if piece.getType() == "Duck":
+                return (x, y)
+
+# The FEN plus the square by square view, so both serializers get compared too, and the game state
+def state(board) -> tuple:
+    squares = tuple(str(board.getPiece((x, y))) for y in range(8) for x in range(8))
+    return board.getFEN(), squares, board.turn, board.passant, board.halfmove, board.fullmove, board.getGameState(), board.getDrawReason()
+
+# Piece moves as sets, so generation order doesn't matter
+def pieceMoves(board) -> dict:
+    return {pos: set(moves) for pos, moves in board.getAllMoves(board.getTurn()).items()}
+
+# Board can send the duck back to its off board square, BitBoard can't, so only on board squares are compared
+def duckMoves(board) -> set:
+    return {move for move in board.getAvailableMoves(findDuck(board)) if move[1] < 8}
+
+# Plays random games on both backends in lockstep, comparing moves and FENs at every step
+def compare(fen: str, games: int, length: int, rng: random.Random) -> int:
+    checked = 0
+    for _ in range(games):
+        board, fast = duck_chess.Board(fen), bitboard.BitBoard(fen)
+        for _ in range(length):
+            moves = pieceMoves(board)
+            assert moves == pieceMoves(fast), f"Piece moves differ in {board.getFEN()}"
+            moves = [(pos, dest) for pos, dests in sorted(moves.items()) for dest in sorted(dests)]
+            if not moves:
+                break
+            move = rng.choice(moves)
+            board.movePiece(*move)
+            fast.movePiece(*move)
+            duck = sorted(duckMoves(board))
+            assert set(duck) == duckMoves(fast), f"Duck moves differ in {board.getFEN()}"
+            dest = rng.choice(duck)
+            board.movePiece(findDuck(board), dest)
+            fast.movePiece(findDuck(fast), dest)
+            assert state(board) == state(fast), f"Positions differ: {board.getFEN()} {fast.getFEN()}"
+            snapshot = bitboard.BitBoard.__new__(bitboard.BitBoard)
+            snapshot.setPosition(fast.getPosition())
+            assert snapshot.getFEN() == fast.getFEN() and snapshot.key == fast.key, f"Snapshot differs in {fast.getFEN()}"
+            checked += 1
+            if board.getGameState() == "win":
+                break
+    return checked
+
+# Counts piece move and duck placement pairs on one Board, putting it back with setFEN after every move the way the
+# original testing.py did. setFEN can't hold the en passant countdown, so it's restored alongside
+def perftBoard(board, depth: int) -> int:
+    nodes = 0
+    fen, passant_time = board.getFEN(), board.passant_time
+    for pos, moves in board.getAllMoves(board.getTurn()).items():
+        for move in moves:
+            board.movePiece(pos, move)
+            if depth == 1:
+                nodes += len(duckMoves(board))
+            else:
+                move_fen, move_time = board.getFEN(), board.passant_time
+                for dest in duckMoves(board):
+                    board.movePiece(findDuck(board), dest)
+                    nodes += perftBoard(board, depth - 1)
+                    board.setFEN(move_fen)
+                    board.passant_time = move_time
+            board.setFEN(fen)
+            board.passant_time = passant_time
+    return nodes
+
+# Same count, walking BitBoard copies and counting the last duck placements with popcount
+def perftBitBoard(board, depth: int) -> int:
+    nodes = 0
+    color = bitboard.WHITE if board.turn else bitboard.BLACK
+    for mask in board.pieces[color]:
+        for sq in bitboard.iterBits(mask):
+            pos = (sq % 8, sq // 8)
+            for dest in bitboard.iterBits(board.moveMask(sq)):
+                child = board.copy()
+                child.movePiece(pos, (dest % 8, dest // 8))
+                duck = child.moveMask(None)
+                if depth == 1:
+                    nodes += duck.bit_count()
+                else:
+                    for duck_sq in bitboard.iterBits(duck):
+                        grandchild = child.copy()
+                        grandchild.movePiece(findDuck(child), (duck_sq % 8, duck_sq // 8))
+                        nodes += perftBitBoard(grandchild, depth - 1)
+    return nodes
+
+rng = random.Random(0)
+total = sum(compare(fen, 20, 60, rng) for fen in POSITIONS)
+print(f"Compared {total} plies across {len(POSITIONS)} positions")
+
+# Malformed FENs are turned away by both backends with the same exception
+BAD_FENS = [
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq -",
+    "rnbqkbnr/ppppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "rnbqkbnr/ppppxppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "rnbqkbnr/pppppppp/9/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP w KQkq - 0 1",
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR x KQkq - 0 1",
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - a 1",
+]
+for fen in BAD_FENS:
+    for backend in (duck_chess.Board, bitboard.BitBoard):
+        try:
+            backend(fen)
+        except duck_chess.InvalidFenException:
+            continue
+        raise AssertionError(f"{backend.__name__} accepted {fen}")
+print(f"Both backends reject {len(BAD_FENS)} bad FENs")
+
+# changeSquares has to leave both backends with the same squares and key
+rng = random.Random(0)
+pieces = [piece for piece in duck_chess.PIECES.values() if piece.getType() != "Duck"] + [duck_chess.EMPTY]
+for fen in POSITIONS:
+    board, fast = duck_chess.Board(fen), bitboard.BitBoard(fen)
+    for _ in range(50):
+        changes = [((rng.randrange(8), rng.randrange(8)), rng.choice(pieces)) for _ in range(3)]
+        board.changeSquares(changes)
+        fast.changeSquares(changes)
+        assert board.getFEN() == fast.getFEN() and board.key == fast.key == fast.computeKey(), f"Squares differ: {board.getFEN()} {fast.getFEN()}"
+print("changeSquares matches")
+
+for fen in POSITIONS[:2]:
+    start = time.perf_counter()
+    slow = perftBoard(duck_chess.Board(fen), 2)
+    slow_time = time.perf_counter() - start
+    start = time.perf_counter()
+    fast = perftBitBoard(bitboard.BitBoard(fen), 2)
+    fast_time = time.perf_counter() - start
+    assert slow == fast, f"Perft differs: {slow} {fast}"
+    print(f"Perft 2: {fast}  Board: {slow_time:.2f}s  BitBoard: {fast_time:.2f}s  Speedup: {slow_time / fast_time:.1f}x")
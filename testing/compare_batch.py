@@ -0,0 +1,88 @@
+import random, sys, time
+sys.path.insert(0, "../")
+import numpy as np
+import duck_chess, batch
+
+# Starting points for the random games, with a duck already down and an en passant square in some of them
+POSITIONS = [
+    duck_chess.DEFAULT_FEN,
+    "r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4",
+    "rnbqkbnr/ppp1pppp/8/3pP3/8/3D4/PPPP1PPP/RNBQKBNR w KQkq d6 0 3",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+]
+
+# Plays random games on Boards and a BoardBatch in lockstep, comparing piece moves, attacked squares, duck squares and
+# FENs at every ply. Games that end stay in the batch with a from square of -1
+def compare(games: int, length: int, rng: random.Random) -> int:
+    boards = [duck_chess.Board(POSITIONS[i % len(POSITIONS)]) for i in range(games)]
+    positions = batch.BoardBatch(boards)
+    done = [False] * games
+    checked = 0
+    for _ in range(length):
+        moves = positions.pieceMoves()
+        attacked = positions.attackedSquares()
+        choices = np.full((3, games), -1)
+        for i, board in enumerate(boards):
+            if done[i]:
+                continue
+            expected = {pos: set(dests) for pos, dests in board.getAllMoves(board.getTurn()).items() if dests}
+            found = {pos: set(dests) for pos, dests in positions.getMoves(i, moves[i]).items()}
+            assert expected == found, f"Piece moves differ in {board.getFEN()}"
+            enemy = batch.unpackSquares(attacked[i, 1 if board.turn else 0])
+            assert set(board.getAttackedSquares()) == {(sq % 8, sq // 8) for sq in np.flatnonzero(enemy)}, f"Attacked squares differ in {board.getFEN()}"
+            pieces = [(pos, dest) for pos, dests in sorted(expected.items()) for dest in sorted(dests)]
+            if not pieces:
+                done[i] = True
+                continue
+            choices[0, i], choices[1, i] = (pos[1] * 8 + pos[0] for pos in rng.choice(pieces))
+        active = np.flatnonzero(choices[0] >= 0)
+        ducks = positions.duckSquares(np.maximum(choices[0], 0), np.maximum(choices[1], 0))
+        for i in active:
+            board = boards[i]
+            (x, y), dest = (choices[0, i] % 8, choices[0, i] // 8), (choices[1, i] % 8, choices[1, i] // 8)
+            board.movePiece((x, y), dest)
+            expected = {y * 8 + x for x, y in board.getEmptySquares()}
+            assert expected == set(np.flatnonzero(batch.unpackSquares(ducks[i]))), f"Duck squares differ in {board.getFEN()}"
+            choices[2, i] = rng.choice(sorted(expected))
+            board.movePiece(board.duck_pos, (choices[2, i] % 8, choices[2, i] // 8))
+        positions.play(*choices)
+        for i in active:
+            assert boards[i].getFEN() == positions.getFEN(i), f"Positions differ: {boards[i].getFEN()} {positions.getFEN(i)}"
+            assert boards[i].passant_time == positions.passant_time[i]
+            checked += 1
+            if boards[i].getGameState() == "win":
+                assert positions.isLost()[i]
+                done[i] = True
+        if all(done):
+            break
+    return checked
+
+rng = random.Random(0)
+print(f"Compared {compare(200, 80, rng)} plies")
+
+# Piece moves for every position, one Board at a time against the whole batch in one go
+fens = []
+for i in range(512):
+    board = duck_chess.Board(POSITIONS[i % len(POSITIONS)])
+    for _ in range(rng.randrange(20)):
+        moves = list(board.generateMoves(piece_moves_only=True))
+        if not moves or board.getGameState() == "win":
+            break
+        board.movePiece(*rng.choice(moves))
+        board.movePiece(board.duck_pos, rng.choice(board.getEmptySquares()))
+    fens.append(board.getFEN())
+boards = [duck_chess.Board(fen) for fen in fens]
+start = time.perf_counter()
+for board in boards:
+    board.getAllMoves(board.getTurn())
+board_rate = len(boards) / (time.perf_counter() - start)
+print(f"Board: {board_rate:.0f} positions/s")
+for size in (1, 16, 256, 4096):
+    positions = batch.BoardBatch((fens * (size // len(fens) + 1))[:size])
+    repeats = max(1, 4096 // size)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        positions.pieceMoves()
+    rate = size * repeats / (time.perf_counter() - start)
+    print(f"Batch of {size}: {rate:.0f} positions/s  Speedup: {rate / board_rate:.1f}x")
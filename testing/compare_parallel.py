@@ -0,0 +1,26 @@
+import sys, time
+sys.path.insert(0, "../")
+import duck_chess, parallel, perft
+from search import Search
+
+POSITIONS = [
+    duck_chess.DEFAULT_FEN,
+    "rnbqkbnr/ppp1pppp/8/3pP3/8/3D4/PPPP1PPP/RNBQKBNR w KQkq d6 0 3",
+    "4k3/8/3D4/8/8/8/8/R3K3 b - - 0 1",
+]
+
+# Root moves spread over workers have to add up to the same perft counts, and find the same score and move as one
+# Search of the whole tree
+if __name__ == "__main__":
+    for fen in POSITIONS:
+        board = duck_chess.Board(fen)
+        assert sum(perft.parallelDivide(fen, 2, workers=2).values()) == perft.perft(board, 2), f"Perft differs in {fen}"
+        for depth in (1, 2):
+            start = time.perf_counter()
+            result = Search(duck_chess.Board(fen)).search(depth=depth)
+            serial_time = time.perf_counter() - start
+            start = time.perf_counter()
+            score, move = parallel.searchRoot(fen, depth, workers=2)
+            parallel_time = time.perf_counter() - start
+            assert (score, move) == (result.score, result.move), f"Search differs in {fen}: {(score, move)} {(result.score, result.move)}"
+            print(f"Depth {depth}: {score}  Search: {serial_time:.2f}s  2 workers: {parallel_time:.2f}s")
@@ -4,7 +4,7 @@ import graphics, duck_chess
 
 
 my_board = duck_chess.Board()
-renderer = graphics.DCRenderer(600, 600, "Duck Chess", my_board, colors={"White":(255, 255, 255), "Black":(0, 0, 0)})
+renderer = graphics.DCRenderer(600, 600, "Duck Chess", my_board, colors={"White":(255, 255, 255), "Black":(0, 0, 0)}, incremental=True)
 
 renderer.addPieces()
 
@@ -15,6 +15,6 @@ while renderer.isRunning():
     renderer.update()
     
     # Done after drawing everything to the screen
-    pygame.display.flip()
+    renderer.present()
 
 pygame.quit()
\ No newline at end of file
@@ -0,0 +1,40 @@
+import os, sys
+sys.path.insert(0, "../")
+# No window or sound card is needed, the dummy drivers stand in for them
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+import pygame
+import graphics, duck_chess
+
+# Resizing the window has to rebuild the sprites at the new square size and repaint the whole board, even when only
+# changed squares are normally drawn
+renderer = graphics.DCRenderer(400, 400, "Duck Chess", duck_chess.Board(), colors={"White": (255, 255, 255), "Black": (0, 0, 0)}, incremental=True)
+assert pygame.display.get_surface().get_flags() & pygame.RESIZABLE, "The window can't be resized"
+renderer.addPieces()
+renderer.update()
+renderer.present()
+
+pygame.display.set_mode((640, 640), pygame.RESIZABLE)
+pygame.event.post(pygame.event.Event(pygame.VIDEORESIZE, w=640, h=640, size=(640, 640)))
+renderer.processInputs()
+assert renderer.full_redraw and renderer.should_update, "A resize didn't ask for a full redraw"
+assert (renderer.width, renderer.height) == (80, 80)
+assert all(sprite.rect.size == (80, 80) for sprite in renderer.pieces.sprites()), "Sprites kept their old size"
+renderer.update()
+assert not renderer.full_redraw
+assert renderer.dirty == [renderer.screen.get_rect()] and renderer.screen.get_size() == (640, 640), "The whole window wasn't redrawn"
+renderer.present()
+
+# A window that isn't square gets squares that aren't either, and each sprite has to cover the square clicks map to
+pygame.display.set_mode((640, 480), pygame.RESIZABLE)
+pygame.event.post(pygame.event.Event(pygame.VIDEORESIZE, w=640, h=480, size=(640, 480)))
+renderer.processInputs()
+assert (renderer.width, renderer.height) == (80, 60)
+for sprite in renderer.pieces.sprites():
+    x, y = int(sprite.rect.x/renderer.width), int(sprite.rect.y/renderer.height)
+    assert sprite.rect == pygame.Rect(x*80, y*60, 80, 60), f"Sprite drawn at {sprite.rect}"
+    assert str(renderer.board.getPiece((x, y))) == sprite.type
+renderer.update()
+renderer.present()
+pygame.quit()
+print("Resize redraws the whole board at 640x640 and 640x480")
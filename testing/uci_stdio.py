@@ -0,0 +1,49 @@
+import os, subprocess, sys, threading
+sys.path.insert(0, "../")
+import uci
+
+UCI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "uci.py")
+# Knights out and back with the duck swapping between two squares, every 4 plies repeats the same position
+REPEATING = "g1f3@d4 g8f6@e4 f3g1@d4 f6g8@e4 " * 3
+
+# Runs the engine over stdin/stdout, feeding it lines and returning everything it wrote. The timeout catches the engine
+# hanging instead of answering
+def run(lines: list, timeout: float = 60) -> list:
+    process = subprocess.run([sys.executable, UCI, "--workers", "1"], input="\n".join(lines) + "\n", capture_output=True, text=True, timeout=timeout)
+    assert process.returncode == 0, process.stderr
+    return process.stdout.splitlines()
+
+output = run(["uci", "isready", "go depth x", "position startpos moves e2e4@e5", "go depth 1", "isready", "quit"])
+assert output[:3] == [f"id name {uci.NAME}", "uciok", "readyok"], output
+assert output[3] == "info string Bad value for depth: 'x'", output
+assert any(line.startswith("bestmove ") and line != "bestmove (none)" for line in output), output
+print(f"Stdio game: {len(output)} lines")
+
+# A search started over stdin has to answer before quit arrives, not just when quit stops it
+process = subprocess.Popen([sys.executable, UCI, "--workers", "1"], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+# Killing a hung engine ends its output, so the reads below fail instead of waiting forever
+watchdog = threading.Timer(60, process.kill)
+watchdog.start()
+process.stdin.write("go depth 1\n")
+process.stdin.flush()
+line = process.stdout.readline()
+while line.startswith("info"):
+    line = process.stdout.readline()
+assert line.startswith("bestmove "), line
+process.stdin.write("quit\n")
+process.stdin.close()
+assert process.wait(timeout=60) == 0
+watchdog.cancel()
+print("Search answered before quit")
+
+# Moves sent with position are replayed where the search runs, so repetitions count
+board = uci.loadPosition(uci.duck_chess.DEFAULT_FEN, REPEATING.split())
+assert board.getDrawReason() == "repetition", board.getDrawReason()
+print("Position moves keep their repetitions")
+
+# Every move the board generates reads back, including en passant with the duck on the taken pawn's square
+board = uci.duck_chess.Board("rnbqkbnr/ppp1pppp/8/3pP3/8/3D4/PPPP1PPP/RNBQKBNR w KQkq d6 0 3")
+assert uci.parseMove(board, "e5d6@d5") == (((4, 3), (3, 2)), (3, 3))
+for move in board.generateMoves():
+    assert uci.parseMove(board, uci.moveNotation(board, move)) == move, move
+print("Generated moves all parse")
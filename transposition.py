@@ -0,0 +1,54 @@
+from array import array
+
+# Bound types for stored values
+EXACT, LOWER, UPPER = 0, 1, 2
+
+# Bytes per entry: key, value, depth, flag and move
+ENTRY_SIZE = 8 + 8 + 2 + 1 + 4
+# Each bucket has a depth-preferred slot followed by an always-replace slot
+BUCKET_SIZE = 2
+
+
+class TranspositionTable():
+    # Allocates enough buckets to fill size_mb megabytes, entries are stored in flat typed arrays rather than Python objects
+    def __init__(self, size_mb: float = 16) -> None:
+        if size_mb <= 0:
+            raise ValueError(f"Invalid table size: {size_mb}")
+        self.buckets = max(1, int(size_mb * 1024 * 1024) // (ENTRY_SIZE * BUCKET_SIZE))
+        self.clear()
+
+    # Empties the table, a depth of -1 marks a slot as unused
+    def clear(self) -> None:
+        slots = self.buckets * BUCKET_SIZE
+        self.keys = array("Q", bytes(8 * slots))
+        self.values = array("q", bytes(8 * slots))
+        self.depths = array("h", [-1]) * slots
+        self.flags = array("B", bytes(slots))
+        self.moves = array("i", [-1]) * slots
+
+    # Returns (depth, value, flag, move) for a key, or None if it isn't stored
+    def probe(self, key: int) -> tuple:
+        slot = key % self.buckets * BUCKET_SIZE
+        for slot in (slot, slot + 1):
+            if self.keys[slot] == key and self.depths[slot] >= 0:
+                return self.depths[slot], self.values[slot], self.flags[slot], self.moves[slot]
+        return None
+
+    # Stores a result, keeping the deepest one for the bucket in the first slot and the most recent in the second
+    def store(self, key: int, depth: int, value: int, flag: int = EXACT, move: int = -1) -> None:
+        slot = key % self.buckets * BUCKET_SIZE
+        if depth < self.depths[slot] and self.keys[slot] != key:
+            slot += 1
+        self.keys[slot] = key
+        self.values[slot] = value
+        self.depths[slot] = depth
+        self.flags[slot] = flag
+        self.moves[slot] = move
+
+    # Returns the number of slots holding an entry
+    def getUsage(self) -> int:
+        return sum(1 for depth in self.depths if depth >= 0)
+
+    # Returns the number of bytes taken by the entries
+    def getSize(self) -> int:
+        return self.buckets * BUCKET_SIZE * ENTRY_SIZE
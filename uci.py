@@ -0,0 +1,219 @@
+import argparse, asyncio, multiprocessing, os, sys
+from concurrent.futures import ProcessPoolExecutor
+import duck_chess
+from search import Search, MATE
+
+# A UCI style line protocol. Moves are written as the piece move then the duck square, like e2e4@e5.
+# Over stdin/stdout one game is played, the socket server gives every connection its own game and all of them share
+# one process pool for searching
+NAME = "Duck Chess"
+
+# The Searches each pool process keeps between searches, by (hash_mb, duck_width), so their transposition tables carry over
+_searchers = {}
+
+
+# Writes a compound move ((pos, dest), duck_dest) in protocol notation
+def moveNotation(board: duck_chess.Board, move: tuple) -> str:
+    (pos, dest), duck = move
+    return f"{board.getNotation(pos)}{board.getNotation(dest)}@{board.getNotation(duck)}"
+
+# Reads a move in protocol notation back into ((pos, dest), duck_dest), raising ValueError if it can't be played
+def parseMove(board: duck_chess.Board, text: str) -> tuple:
+    try:
+        piece_move, duck = text.split("@")
+        pos, dest, duck = board.getNotation(piece_move[:2]), board.getNotation(piece_move[2:4]), board.getNotation(duck)
+    except (ValueError, IndexError):
+        raise ValueError(f"Badly formed move: '{text}'")
+    if len(piece_move) != 4 or not all(0 <= x < 8 and 0 <= y < 8 for x, y in (pos, dest, duck)):
+        raise ValueError(f"Badly formed move: '{text}'")
+    if board.getPiece(pos).getColor() != board.getTurn() or dest not in board.getAvailableMoves(pos) or not board.isDuckSquare(pos, dest, duck):
+        raise ValueError(f"Illegal move: '{text}'")
+    return ((pos, dest), duck)
+
+# Plays a compound move on the board
+def playMove(board: duck_chess.Board, move: tuple) -> None:
+    board.makeMove(move[0])
+    board.makeMove((board.duck_pos, move[1]))
+
+# Sets up a board from a FEN and the moves played from it in protocol notation, so the board's repetition counts
+# include those moves. Raises ValueError or InvalidFenException if either can't be read
+def loadPosition(fen: str, moves: list) -> duck_chess.Board:
+    board = duck_chess.Board(fen)
+    for text in moves:
+        playMove(board, parseMove(board, text))
+    return board
+
+# Formats a finished iteration as an info line
+def infoLine(board: duck_chess.Board, result) -> str:
+    if abs(result.score) >= MATE - 1000:
+        plies = MATE - abs(result.score)
+        score = f"mate {(plies + 1) // 2 if result.score > 0 else -((plies + 1) // 2)}"
+    else:
+        score = f"cp {result.score}"
+    pv = []
+    for move in result.pv:
+        pv.append(moveNotation(board, move))
+        playMove(board, move)
+    for _ in result.pv:
+        board.unmakeMove()
+        board.unmakeMove()
+    return f"info depth {result.depth} score {score} nodes {result.nodes} time {int(result.time * 1000)} pv {' '.join(pv)}"
+
+# Runs in a pool process. Returns the SearchResult of every finished iteration, the last one being the answer
+def _runSearch(fen: str, moves: list, depth: int, movetime: float, nodes: int, stop, hash_mb: float, duck_width: int) -> list:
+    if (hash_mb, duck_width) not in _searchers:
+        _searchers[(hash_mb, duck_width)] = Search(duck_chess.Board(), hash_mb, duck_width)
+    searcher = _searchers[(hash_mb, duck_width)]
+    searcher.board = loadPosition(fen, moves)
+    results = []
+    searcher.search(depth, movetime, nodes, results.append, stop)
+    return results
+
+class EngineSession():
+    # The protocol state of one game. send is a coroutine function that writes a line back to whoever drives the game,
+    # searches run on executor and are stopped through Events made by manager, so they can reach the pool processes
+    def __init__(self, executor, manager, send, hash_mb: float = 16, duck_width: int = 6) -> None:
+        self.executor = executor
+        self.manager = manager
+        self.send = send
+        self.hash_mb = hash_mb
+        self.duck_width = duck_width
+        # The position is kept as the FEN it started from plus the moves since, which searches replay
+        self.fen = duck_chess.DEFAULT_FEN
+        self.moves = []
+        self.task = None
+        self.stop = None
+
+    # Handles one line of input, returns False once the game should end
+    async def handle(self, line: str) -> bool:
+        words = line.split()
+        if not words:
+            return True
+        command, arguments = words[0], words[1:]
+        if command == "uci":
+            await self.send(f"id name {NAME}")
+            await self.send("uciok")
+        elif command == "isready":
+            await self.send("readyok")
+        elif command == "ucinewgame":
+            await self.stopSearch()
+            self.fen, self.moves = duck_chess.DEFAULT_FEN, []
+        elif command == "position":
+            await self.stopSearch()
+            await self.setPosition(arguments)
+        elif command == "go":
+            await self.go(arguments)
+        elif command == "stop":
+            await self.stopSearch()
+        elif command == "quit":
+            await self.stopSearch()
+            return False
+        else:
+            await self.send(f"info string Unknown command: '{command}'")
+        return True
+
+    # position startpos|fen <fen> [moves <move> ...]
+    async def setPosition(self, arguments: list) -> None:
+        moves = arguments.index("moves") if "moves" in arguments else len(arguments)
+        try:
+            if arguments[:1] == ["startpos"]:
+                fen = duck_chess.DEFAULT_FEN
+            elif arguments[:1] == ["fen"]:
+                fen = " ".join(arguments[1:moves])
+            else:
+                raise ValueError("position needs startpos or fen")
+            loadPosition(fen, arguments[moves + 1:])
+        except (ValueError, duck_chess.InvalidFenException) as error:
+            await self.send(f"info string {error}")
+            return
+        self.fen, self.moves = fen, arguments[moves + 1:]
+
+    # go [depth <n>] [movetime <ms>] [nodes <n>] [infinite], with no limits the search runs until stop
+    async def go(self, arguments: list) -> None:
+        await self.stopSearch()
+        limits = {"depth": None, "movetime": None, "nodes": None}
+        for name, value in zip(arguments, arguments[1:]):
+            if name in limits:
+                try:
+                    limits[name] = int(value)
+                except ValueError:
+                    await self.send(f"info string Bad value for {name}: '{value}'")
+                    return
+        movetime = limits["movetime"] / 1000 if limits["movetime"] != None else None
+        self.stop = self.manager.Event()
+        self.task = asyncio.get_running_loop().create_task(self.search(self.fen, self.moves, limits["depth"], movetime, limits["nodes"], self.stop))
+
+    async def search(self, fen: str, moves: list, depth: int, movetime: float, nodes: int, stop) -> None:
+        results = await asyncio.get_running_loop().run_in_executor(self.executor, _runSearch, fen, moves, depth, movetime, nodes, stop, self.hash_mb, self.duck_width)
+        board = loadPosition(fen, moves)
+        for result in results:
+            await self.send(infoLine(board, result))
+        best = results[-1].move if results else None
+        await self.send(f"bestmove {moveNotation(board, best) if best != None else '(none)'}")
+
+    # Stops the running search, waiting for its bestmove to be sent
+    async def stopSearch(self) -> None:
+        if self.task != None:
+            self.stop.set()
+            await self.task
+            self.task = None
+
+# Plays one game over stdin and stdout
+async def serveStdio(executor, manager, hash_mb: float) -> None:
+    async def send(line: str) -> None:
+        print(line, flush=True)
+    session = EngineSession(executor, manager, send, hash_mb)
+    loop = asyncio.get_running_loop()
+    while True:
+        line = await loop.run_in_executor(None, sys.stdin.readline)
+        if not line or not await session.handle(line):
+            break
+    await session.stopSearch()
+
+# Serves games over TCP, one per connection, until cancelled
+async def serveSocket(executor, manager, hash_mb: float, host: str, port: int) -> None:
+    async def handleConnection(reader, writer) -> None:
+        async def send(line: str) -> None:
+            writer.write((line + "\n").encode())
+            await writer.drain()
+        session = EngineSession(executor, manager, send, hash_mb)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line or not await session.handle(line.decode()):
+                    break
+            await session.stopSearch()
+        except ConnectionError:
+            if session.stop != None:
+                session.stop.set()
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handleConnection, host, port)
+    async with server:
+        await server.serve_forever()
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Runs the engine over a UCI style text protocol, on stdin/stdout or a socket")
+    parser.add_argument("--port", type=int, help="Serve games over TCP on this port instead of stdin/stdout")
+    parser.add_argument("--host", default="127.0.0.1", help="Address the socket server listens on")
+    parser.add_argument("--workers", type=int, default=0, help="Processes searches run on, 0 for one per core")
+    parser.add_argument("--hash", type=float, default=16, help="Transposition table size per worker in megabytes")
+    args = parser.parse_args(argv)
+
+    workers = args.workers or (os.cpu_count() or 1 if args.port != None else 1)
+    # Pool processes are started on the first search, while a thread may be blocked reading stdin. Forking then copies
+    # that thread's hold on stdin into the child, which hangs closing it, so they're spawned instead
+    context = multiprocessing.get_context("spawn")
+    with multiprocessing.Manager() as manager, ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        if args.port == None:
+            asyncio.run(serveStdio(executor, manager, args.hash))
+        else:
+            try:
+                asyncio.run(serveSocket(executor, manager, args.hash, args.host, args.port))
+            except KeyboardInterrupt:
+                pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())